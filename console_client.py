@@ -5,18 +5,62 @@ Provides an interactive interface to connect to the advanced travel agent
 """
 
 
-import requests
+import asyncio
+import httpx
 import json
+import os
+import socket
+import ujson
 import sys
 import time
-from typing import Optional, Dict, Any
+from typing import ClassVar, Optional, Dict, Any, List
+
+BANNER = "=" * 50
+
+# Requests are small JSON payloads: send them immediately instead of waiting on Nagle
+SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
 
 class AITalkClient:
+    # HTTP client shared by every AITalkClient so all code paths reuse one connection pool
+    _shared_client: ClassVar[Optional[httpx.AsyncClient]] = None
+    
     def __init__(self, base_url: str = "http://localhost:8001"):
         self.base_url = base_url
-        self.session = requests.Session()
     
-    def send_message(self, message: str, model: str = "openrouter/google/gemini-2.0-flash-exp:free", max_tokens: int = 1024) -> Optional[dict]:
+    @classmethod
+    def _client(cls) -> httpx.AsyncClient:
+        """
+        Return the shared HTTP client, creating it on first use
+        """
+        if cls._shared_client is None or cls._shared_client.is_closed:
+            # HTTP/2 with a small keep-alive pool so every turn reuses the same connection.
+            # Keep-alive is the default for HTTP/1.1 and HTTP/2, so only the pool
+            # size and idle expiry are tuned; trust_env=False skips proxy lookup.
+            cls._shared_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0),
+                transport=httpx.AsyncHTTPTransport(
+                    http2=True,
+                    retries=2,
+                    socket_options=SOCKET_OPTIONS,
+                    limits=httpx.Limits(max_connections=8, max_keepalive_connections=4, keepalive_expiry=85)
+                ),
+                trust_env=False
+            )
+        return cls._shared_client
+    
+    @classmethod
+    async def aclose(cls):
+        """
+        Close the shared HTTP client
+        """
+        if cls._shared_client is not None:
+            await cls._shared_client.aclose()
+            cls._shared_client = None
+    
+    async def send_message(self, message: str, model: str = "openrouter/google/gemini-2.0-flash-exp:free", max_tokens: int = 1024) -> Optional[dict]:
         """
         Send a message to the AI agent and get response
         """
@@ -25,19 +69,56 @@ class AITalkClient:
                 "message": message
             }
             
-            response = self.session.post(
+            response = await self._client().post(
                 f"{self.base_url}/travel-agent",
-                json=payload,
+                content=ujson.dumps(payload, ensure_ascii=False).encode("utf-8"),
                 headers={"Content-Type": "application/json"}
             )
             
             if response.status_code == 200:
-                return response.json()
+                return ujson.loads(response.content)
             else:
                 print(f"Error: {response.status_code} - {response.text}")
                 return None
                 
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
+            print(f"Error: Could not connect to server at {self.base_url}")
+            print("Make sure the FastAPI server is running with: python main.py")
+            return None
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            return None
+    
+    async def stream_message(self, message: str, model: str = "openrouter/google/gemini-2.0-flash-exp:free", max_tokens: int = 1024) -> Optional[str]:
+        """
+        Send a message to /chat/stream and print the response as it arrives
+        """
+        try:
+            payload = {
+                "message": message,
+                "model": model,
+                "max_tokens": max_tokens
+            }
+            
+            chunks = []
+            async with self._client().stream(
+                "POST",
+                f"{self.base_url}/chat/stream",
+                content=ujson.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                headers={"Content-Type": "application/json"}
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    print(f"Error: {response.status_code} - {response.text}")
+                    return None
+                async for text in response.aiter_text():
+                    chunks.append(text)
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+            sys.stdout.write("\n")
+            return "".join(chunks)
+                
+        except httpx.ConnectError:
             print(f"Error: Could not connect to server at {self.base_url}")
             print("Make sure the FastAPI server is running with: python main.py")
             return None
@@ -45,7 +126,7 @@ class AITalkClient:
             print(f"Error: {str(e)}")
             return None
     
-    def run_travel_agent(self, message: str) -> Optional[dict]:
+    async def run_travel_agent(self, message: str) -> Optional[dict]:
         """
         Run the travel agent with a message about trip purpose
         """
@@ -54,19 +135,83 @@ class AITalkClient:
                 "message": message
             }
             
-            response = self.session.post(
+            response = await self._client().post(
                 f"{self.base_url}/travel-agent",
-                json=payload,
+                content=ujson.dumps(payload, ensure_ascii=False).encode("utf-8"),
                 headers={"Content-Type": "application/json"}
             )
             
             if response.status_code == 200:
-                return response.json()
+                return ujson.loads(response.content)
             else:
                 print(f"Error: {response.status_code} - {response.text}")
                 return None
                 
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
+            print(f"Error: Could not connect to server at {self.base_url}")
+            print("Make sure the FastAPI server is running with: python main.py")
+            return None
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            return None
+
+    async def stream_travel_agent(self, turns: List[str]) -> Optional[str]:
+        """
+        Run travel agent turns via /travel-agent/stream and print memory items as they arrive.
+        Returns the final conversation status, or None on failure
+        """
+        try:
+            payload = {
+                "turns": turns
+            }
+            
+            status = None
+            async with self._client().stream(
+                "POST",
+                f"{self.base_url}/travel-agent/stream",
+                content=ujson.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                headers={"Content-Type": "application/json"}
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    print(f"Error: {response.status_code} - {response.text}")
+                    return None
+                
+                sys.stdout.write(f"\n📝 Travel Agent Memory:\n{BANNER}\n")
+                # Frames are 8 hex digits of payload length, the JSON payload and a newline
+                buffer = bytearray()
+                # Assistant text already printed from delta frames, so its full item is skipped
+                streamed = []
+                async for chunk in response.aiter_bytes():
+                    buffer.extend(chunk)
+                    while len(buffer) >= 8:
+                        size = int(buffer[:8], 16)
+                        if len(buffer) < 8 + size + 1:
+                            break
+                        item = ujson.loads(bytes(buffer[8:8 + size]))
+                        del buffer[:8 + size + 1]
+                        
+                        if item['type'] == 'status':
+                            status = item['content']
+                            continue
+                        if item['type'] == 'delta':
+                            if not streamed:
+                                sys.stdout.write("\nASSISTANT: ")
+                            streamed.append(item['content'])
+                            sys.stdout.write(item['content'])
+                            sys.stdout.flush()
+                            continue
+                        if streamed and item['type'] == 'assistant' and item['content'] == "".join(streamed):
+                            sys.stdout.write("\n")
+                            streamed.clear()
+                            continue
+                        sys.stdout.write(f"\n{item['type'].upper()}: {item['content']}\n")
+                        sys.stdout.flush()
+                sys.stdout.write(f"\n{BANNER}\n")
+                sys.stdout.flush()
+            return status
+                
+        except httpx.ConnectError:
             print(f"Error: Could not connect to server at {self.base_url}")
             print("Make sure the FastAPI server is running with: python main.py")
             return None
@@ -74,28 +219,110 @@ class AITalkClient:
             print(f"Error: {str(e)}")
             return None
 
-    def check_health(self) -> bool:
+    async def check_health(self) -> bool:
         """
         Check if the server is healthy
         """
         try:
-            response = self.session.get(f"{self.base_url}/health")
+            response = await self._client().get(f"{self.base_url}/health")
             return response.status_code == 200
         except:
             return False
 
-def main():
+async def exit_command(client: AITalkClient, user_input: str) -> bool:
+    """
+    Stop the REPL
+    """
+    print("👋 Пока!")
+    return False
+
+async def travel_command(client: AITalkClient, user_input: str) -> bool:
+    """
+    Start a new travel agent interview; the server resets on the travel keyword
+    """
+    print("\n🌍 Starting Travel Agent - Trip Purpose Interview")
+    if await client.stream_travel_agent([user_input]) is None:
+        print("❌ Failed to get response from Travel Agent")
+    return True
+
+# Messages starting with this prefix are sent to /chat/stream instead of the travel agent
+CHAT_PREFIX = "/chat"
+
+# REPL commands keyed by lowercased input; a handler returns False to stop the loop
+COMMANDS = {
+    'quit': exit_command,
+    'exit': exit_command,
+    'q': exit_command,
+    'travel': travel_command,
+    'путешествие': travel_command,
+}
+
+class ConsoleReader:
+    """
+    Reads stdin lines on the event loop so pending requests are not blocked. Unlike
+    input() in a worker thread, nothing is left blocked on stdin after Ctrl-C.
+    Where the loop cannot watch stdin (a regular file, the Windows Proactor loop)
+    lines are read in a worker thread instead
+    """
+    def __init__(self):
+        self.fd = sys.stdin.fileno()
+        self.buffer = bytearray()
+        self.eof = False
+        self.threaded = False
+    
+    async def readline(self, prompt: str) -> str:
+        """
+        Print the prompt and return the next line without its newline; raises EOFError at end of input
+        """
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        if self.threaded:
+            return await self._readline_in_thread()
+        
+        loop = asyncio.get_running_loop()
+        while b"\n" not in self.buffer and not self.eof:
+            readable = loop.create_future()
+            try:
+                loop.add_reader(self.fd, lambda: readable.done() or readable.set_result(None))
+            except (NotImplementedError, PermissionError):
+                # Nothing has been buffered yet: add_reader fails on the first call or never
+                self.threaded = True
+                return await self._readline_in_thread()
+            try:
+                await readable
+            finally:
+                loop.remove_reader(self.fd)
+            chunk = os.read(self.fd, 4096)
+            if chunk:
+                self.buffer.extend(chunk)
+            else:
+                self.eof = True
+        
+        if not self.buffer:
+            raise EOFError
+        line, _, rest = bytes(self.buffer).partition(b"\n")
+        self.buffer[:] = rest
+        return line.decode("utf-8", errors="replace")
+    
+    async def _readline_in_thread(self) -> str:
+        line = await asyncio.to_thread(sys.stdin.readline)
+        if not line:
+            raise EOFError
+        return line.rstrip("\n")
+
+async def main():
     """
     Main console interface
     """
     print("🤖 Привет! Я консультант Кумар-Аравинд-Шива. Я могу проконсультировать Вас, по поводу вашей поездки. Я знаю очень многое по путеществиям. Я брахман, трахман, шаман в 105-м поколении. Я знаю почти все, либо все, что могу найти в интернете. Задавайте ваши вопроса!")
-    print("=" * 50)
+    print(BANNER)
     
     # Initialize client
     client = AITalkClient()
+    reader = ConsoleReader()
     
     # Check server health
-    if not client.check_health():
+    if not await client.check_health():
         print("❌ Server is not available. Please start the server first:")
         print("   python main.py")
         sys.exit(1)
@@ -104,64 +331,61 @@ def main():
     print("\nДоступные режимы:")
     print("1. Обычный чат — просто напишите сообщение")
     print("2. Турагент — введите «путешествие», чтобы начать собеседование о цели поездки.")
+    print("3. Несколько ответов сразу — разделите их символом «|».")
+    print(f"4. Свободный вопрос модели — начните сообщение с «{CHAT_PREFIX}».")
     print("Чтобы остановить, введите «quit» или «exit».")
     print("-" * 50)
     
-    while True:
-        try:
-            # Get user input
-            user_input = input("\n💬 Вы: ").strip()
-            
-            # Check for exit commands
-            if user_input.lower() in ['quit', 'exit', 'q']:
-                print("👋 Пока!")
+    try:
+        while True:
+            # Get user input; a failing reader ends the session instead of being retried
+            try:
+                user_input = (await reader.readline("\n💬 Вы: ")).strip()
+            except EOFError:
+                print("\n\n👋 Goodbye!")
                 break
+            except Exception as e:
+                print(f"❌ Cannot read input: {str(e)}")
+                sys.exit(1)
             
-            if not user_input:
-                continue
-            
-            # Check for travel agent mode
-            if user_input.lower() == 'Путешествие':
-                print("\n🌍 Starting Travel Agent - Trip Purpose Interview")
-                print("What is the purpose of your trip?")
-                trip_purpose = input("Trip purpose: ").strip()
+            try:
+                if not user_input:
+                    continue
                 
-                if not trip_purpose:
-                    trip_purpose = "I want to plan a trip"
+                # Free-form questions go straight to the model, streamed as they are generated
+                if user_input.lower().startswith(CHAT_PREFIX):
+                    question = user_input[len(CHAT_PREFIX):].strip()
+                    if question:
+                        sys.stdout.write("\n🤖 ")
+                        if await client.stream_message(question) is None:
+                            print("❌ Failed to get response from AI")
+                    continue
                 
-                print("\n🤖 Travel Agent is processing your request...")
-                result = client.run_travel_agent(trip_purpose)
+                # Commands (exit, start travel interview) are dispatched on the lowercased input
+                command = COMMANDS.get(user_input.lower())
+                if command:
+                    if not await command(client, user_input):
+                        break
+                    continue
                 
-                if result:
-                    print(f"\n📝 Travel Agent Memory:")
-                    print("=" * 50)
-                    for item in result.get('memory', []):
-                        print(f"\n{item['type'].upper()}: {item['content']}")
-                    print("\n" + "=" * 50)
-                    #print(f"Status: {result.get('status', 'unknown')}")
-                else:
-                    print("❌ Failed to get response from Travel Agent")
-                continue
-            
-            # Regular chat mode
-            print("🤔 Я думаю...")
-            result = client.send_message(user_input)
-            
-            if result:
-                print(f"\n📝 Travel Agent Memory:")
-                print("=" * 50)
-                for item in result.get('memory', []):
-                    print(f"\n{item['type'].upper()}: {item['content']}")
-                print("\n" + "=" * 50)
-                #print(f"Status: {result.get('status', 'unknown')}")
-            else:
-                print("❌ Failed to get response from AI")
+                # Regular chat mode; several answers separated by "|" go out as one batch
+                print("🤔 Я думаю...")
+                # Memory items are streamed and printed as the server produces them
+                turns = [turn.strip() for turn in user_input.split("|") if turn.strip()]
+                status = await client.stream_travel_agent(turns)
                 
-        except KeyboardInterrupt:
-            print("\n\n👋 Goodbye!")
-            break
-        except Exception as e:
-            print(f"❌ Error: {str(e)}")
+                if status is None:
+                    print("❌ Failed to get response from AI")
+                    
+            except Exception as e:
+                print(f"❌ Error: {str(e)}")
+    finally:
+        # Also runs when asyncio.run cancels this task on Ctrl-C
+        await client.aclose()
 
 if __name__ == "__main__":
-    main()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # asyncio.run cancels main() and re-raises the interrupt here
+        print("\n\n👋 Goodbye!")
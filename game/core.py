@@ -1,14 +1,22 @@
 import json
+import logging
+import os
+import threading
 import time
 import traceback
 import inspect
-from litellm import completion
+from concurrent.futures import Future
 from dataclasses import dataclass, field
 from typing import get_type_hints, List, Callable, Dict, Any
 
+logger = logging.getLogger(__name__)
+
 tools = {}
 tools_by_tag = {}
 
+# When tool metadata is loaded from a prebuilt manifest, skip the decorator's introspection
+TOOLS_FROM_MANIFEST = os.getenv("GAME_TOOLS_FROM_MANIFEST") == "1"
+
 
 def to_openai_tools(tools_metadata: List[dict]):
     openai_tools = [
@@ -115,6 +123,9 @@ def register_tool(tool_name=None, description=None, parameters_override=None, te
         function: The wrapped function.
     """
     def decorator(func):
+        if TOOLS_FROM_MANIFEST:
+            return func
+
         # Use the reusable function to extract metadata
         metadata = get_tool_metadata(
             func=func,
@@ -143,6 +154,34 @@ def register_tool(tool_name=None, description=None, parameters_override=None, te
     return decorator
 
 
+def write_tool_manifest(path: str, tool_names: List[str] = None):
+    """
+    Writes the metadata of registered tools to a JSON manifest for PythonActionRegistry.from_manifest.
+
+    Parameters:
+        path (str): Where to write the manifest.
+        tool_names (List[str], optional): Tools to include. Defaults to every registered tool.
+    """
+    if TOOLS_FROM_MANIFEST:
+        # register_tool skips registration in this mode, so the manifest would come out empty
+        raise RuntimeError("Cannot write the tool manifest with GAME_TOOLS_FROM_MANIFEST=1, unset it to build the manifest")
+    manifest = [
+        {
+            "tool_name": tool_name,
+            "function": tool_desc["function"].__name__,
+            "description": tool_desc["description"],
+            "parameters": tool_desc["parameters"],
+            "terminal": tool_desc["terminal"],
+            "tags": tool_desc["tags"]
+        } for tool_name, tool_desc in tools.items()
+        if not tool_names or tool_name in tool_names
+    ]
+    if not manifest:
+        raise RuntimeError("No registered tools to write to the tool manifest")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
 @dataclass
 class Prompt:
     messages: List[Dict] = field(default_factory=list)
@@ -150,6 +189,79 @@ class Prompt:
     metadata: dict = field(default_factory=dict)  # Fixing mutable default issue
 
 
+class CompletionBatcher:
+    """
+    Collects completion calls made from concurrent threads over a short window and
+    sends calls that share a model and arguments as one litellm.batch_completion.
+    """
+
+    def __init__(self, window: float = 0.02, max_batch_size: int = 16):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self._pending: Dict[Any, List] = {}
+
+    def submit(self, model: str, messages: List[Dict], **kwargs):
+        """Queue a completion call and block until its response is available"""
+        key = (model, json.dumps(kwargs, sort_keys=True, default=str))
+        future = Future()
+        with self._lock:
+            pending = self._pending.setdefault(key, [])
+            pending.append((messages, future))
+            # The first caller for a key waits out the window and dispatches the batch
+            leader = len(pending) == 1
+        if leader:
+            time.sleep(self.window)
+            with self._lock:
+                batch = self._pending.pop(key)
+            try:
+                for start in range(0, len(batch), self.max_batch_size):
+                    self._dispatch(model, kwargs, batch[start:start + self.max_batch_size])
+            except BaseException as e:
+                # Followers block on their futures, so the error has to reach every one of them
+                self._fail_unresolved(batch, e)
+                raise
+            # A short response list would otherwise leave callers waiting forever
+            self._fail_unresolved(batch, RuntimeError("No response returned for batched completion"))
+        return future.result()
+
+    @staticmethod
+    def _fail_unresolved(batch: List, error: BaseException):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _dispatch(self, model: str, kwargs: Dict, batch: List):
+        try:
+            # litellm pulls in every provider SDK, so it is only imported once a call is made
+            from litellm import completion, batch_completion
+            if len(batch) == 1:
+                responses = [completion(model=model, messages=batch[0][0], **kwargs)]
+            else:
+                responses = batch_completion(model=model, messages=[messages for messages, _ in batch], **kwargs)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), response in zip(batch, responses):
+            if isinstance(response, Exception):
+                future.set_exception(response)
+            else:
+                future.set_result(response)
+
+
+completion_batcher = CompletionBatcher()
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalize a message for near-duplicate cache lookup: casefold, collapse whitespace and drop
+    trailing sentence punctuation. Other punctuation is kept, it can change the question
+    ("2+2" vs "2-2", "C++" vs "C")
+    """
+    return " ".join(message.casefold().split()).rstrip(" .!?")
+
+
 def generate_response(prompt: Prompt) -> str:
     """Вызвать LLM для получения ответа с использованием модели Qwen"""
 
@@ -158,15 +270,9 @@ def generate_response(prompt: Prompt) -> str:
 
     result = None
 
-    # Ensure litellm is configured for OpenRouter
-    import litellm
-    # Note: add_function_to_prompt can cause issues with newer litellm versions
-    # litellm.add_function_to_prompt = True
-    litellm.set_verbose = True
-
     try:
         if not tools:
-            response = completion(
+            response = completion_batcher.submit(
                 model="openrouter/google/gemini-2.0-flash-exp:free",
                 messages=messages,
                 max_tokens=1024
@@ -182,7 +288,7 @@ def generate_response(prompt: Prompt) -> str:
                     # Handle different tool formats
                     formatted_tools.append(tool)
             
-            response = completion(
+            response = completion_batcher.submit(
                 model="openrouter/google/gemini-2.0-flash-exp:free",
                 messages=messages,
                 tools=formatted_tools,
@@ -200,17 +306,17 @@ def generate_response(prompt: Prompt) -> str:
                 result = response.choices[0].message.content
 
     except Exception as e:
-        print(f"Error in generate_response: {e}")
+        logger.warning("Error in generate_response: %s", e)
         # Fallback to simple completion without tools
         try:
-            response = completion(
+            response = completion_batcher.submit(
                 model="openrouter/google/gemini-2.0-flash-exp:free",
                 messages=messages,
                 max_tokens=1024
             )
             result = response.choices[0].message.content
         except Exception as fallback_error:
-            print(f"Fallback error: {fallback_error}")
+            logger.warning("Fallback error: %s", fallback_error)
             result = "Error: Unable to generate response"
 
     return result
@@ -442,6 +548,37 @@ class PythonActionRegistry(ActionRegistry):
         else:
             raise Exception("Terminate tool not found in tool registry")
 
+    @classmethod
+    def from_manifest(cls, path: str, module, tags: List[str] = None) -> "PythonActionRegistry":
+        """
+        Build a registry from a manifest written by write_tool_manifest, binding each tool
+        to the function of the same name in module instead of scanning the decorators.
+        """
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        registry = cls.__new__(cls)
+        ActionRegistry.__init__(registry)
+        registry.terminate_tool = None
+
+        for entry in manifest:
+            tool_desc = dict(entry, function=getattr(module, entry["function"]))
+            if tool_desc["tool_name"] == "terminate":
+                registry.terminate_tool = tool_desc
+
+            if tags and not any(tag in tool_desc["tags"] for tag in tags):
+                continue
+
+            registry.register(Action(
+                name=tool_desc["tool_name"],
+                function=tool_desc["function"],
+                description=tool_desc["description"],
+                parameters=tool_desc.get("parameters", {}),
+                terminal=tool_desc.get("terminal", False)
+            ))
+
+        return registry
+
 
 
 class Agent:
@@ -507,17 +644,17 @@ class Agent:
             # Construct a prompt that includes the Goals, Actions, and the current Memory
             prompt = self.construct_prompt(self.goals, memory, self.actions)
 
-            print("Agent thinking...")
+            logger.debug("Agent thinking...")
             # Generate a response from the agent
             response = self.prompt_llm_for_action(prompt)
-            print(f"Agent Decision: {response}")
+            logger.debug("Agent Decision: %s", response)
 
             # Determine which action the agent wants to execute
             action, invocation = self.get_action(response)
 
             # Execute the action in the environment
             result = self.environment.execute_action(action, invocation["args"])
-            print(f"Action Result: {result}")
+            logger.debug("Action Result: %s", result)
 
             # Update the agent's memory with information about what happened
             self.update_memory(memory, response, result)
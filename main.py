@@ -1,74 +1,240 @@
+import asyncio
+import functools
 import json
 import os
-from typing import Dict, Any
+import re
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import orjson
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-import litellm
-from litellm import completion
+import anyio
 from dotenv import load_dotenv
-from simple_travel_agent import run_simple_travel_agent
-from travel_agent import run_travel_agent_with_input
+from game.core import normalize_message
 #import pydevd_pycharm
 
 # Load environment variables
 #pydevd_pycharm.settrace('localhost', port=12388, stdoutToServer=True, stderrToServer=True)
 load_dotenv()
-litellm.set_verbose=True
-#litellm.turn_on_debug()
 
+# Cache backends supported by the pinned litellm release
+LITELLM_CACHE_TYPES = ("local", "redis")
 
-# Configure litellm for OpenRouter function calling
-# Note: add_function_to_prompt can cause issues with newer litellm versions
-# litellm.add_function_to_prompt = True
+@functools.lru_cache(maxsize=None)
+def get_litellm():
+    """
+    Import and configure litellm on first use; it pulls in hundreds of modules,
+    so deferring it keeps /health responsive right after startup
+    """
+    import litellm
+    from litellm.caching import Cache
+
+    # Verbose logging formats every request/response, keep it opt-in
+    if os.getenv("LITELLM_VERBOSE") == "1":
+        litellm.set_verbose = True
+
+    # /chat already caches responses in ResponseCache; litellm's own cache is opt-in via
+    # LITELLM_CACHE_TYPE ("local" is an unbounded in-process dict without TTL, so prefer "redis")
+    cache_type = os.getenv("LITELLM_CACHE_TYPE")
+    if cache_type:
+        if cache_type not in LITELLM_CACHE_TYPES:
+            raise ValueError(f"Unsupported LITELLM_CACHE_TYPE {cache_type!r}, expected one of {', '.join(LITELLM_CACHE_TYPES)}")
+        litellm.cache = Cache(type=cache_type)
+
+    return litellm
 
-app = FastAPI(title="AI Talk Travel Agent", description="A FastAPI application that forwards messages to neural networks using litellm")
+app = FastAPI(
+    title="AI Talk Travel Agent",
+    description="A FastAPI application that forwards messages to neural networks using litellm",
+    default_response_class=ORJSONResponse
+)
 
 class MessageRequest(BaseModel):
     message: str
     model: str = "openrouter/google/gemini-2.0-flash-exp:free"
     max_tokens: int = 1024
 
-class MessageResponse(BaseModel):
-    response: str
-    model_used: str
-    tokens_used: int = None
-
 class TravelAgentRequest(BaseModel):
     message: str
 
-class TravelAgentResponse(BaseModel):
-    memory: list
-    status: str
+class TravelAgentBatchRequest(BaseModel):
+    turns: List[str]
 
-def generate_ai_response(message: str, model: str = "openrouter/google/gemini-2.0-flash-exp:free", max_tokens: int = 1024) -> Dict[str, Any]:
+class ResponseCache:
+    """
+    Bounded LRU cache of chat responses with a per-entry TTL
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.items: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """Return the cached value, evicting it if it has expired"""
+        entry = self.items.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.time() - stored_at > self.ttl:
+            del self.items[key]
+            return None
+        self.items.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple, value: Dict[str, Any]):
+        """Store a value, dropping the least recently used entry when full"""
+        self.items[key] = (time.time(), value)
+        self.items.move_to_end(key)
+        if len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+class CompletionBatcher:
+    """
+    Background worker that collects concurrent chat completions from an asyncio.Queue
+    and dispatches requests for the same model together via litellm.batch_completion
+    """
+    def __init__(self, window: float = 0.02, max_batch_size: int = 16):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        # The event loop only keeps weak references to tasks, hold the in-flight dispatches here
+        self.dispatches: set = set()
+
+    def start(self):
+        """Start the worker on the running event loop"""
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the worker and any dispatches still in flight"""
+        if self.worker:
+            self.worker.cancel()
+            self.worker = None
+        for task in list(self.dispatches):
+            task.cancel()
+
+    async def submit(self, model: str, messages: List[Dict], max_tokens: int):
+        """Queue a completion request and wait for its response"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((model, max_tokens, messages, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Only requests with the same model and token limit can share a batch
+            groups: Dict[Tuple[str, int], list] = {}
+            for item in batch:
+                groups.setdefault((item[0], item[1]), []).append(item)
+            for (model, max_tokens), items in groups.items():
+                task = asyncio.create_task(self._dispatch(model, max_tokens, items))
+                self.dispatches.add(task)
+                task.add_done_callback(self.dispatches.discard)
+
+    async def _dispatch(self, model: str, max_tokens: int, items: list):
+        try:
+            if len(items) == 1:
+                responses = [await get_litellm().acompletion(model=model, messages=items[0][2], max_tokens=max_tokens)]
+            else:
+                # batch_completion fans the requests out over litellm's own thread pool
+                responses = await anyio.to_thread.run_sync(functools.partial(
+                    get_litellm().batch_completion,
+                    model=model,
+                    messages=[item[2] for item in items],
+                    max_tokens=max_tokens
+                ))
+        except asyncio.CancelledError:
+            # Don't leave the callers waiting on a dispatch that will never finish
+            for item in items:
+                item[3].cancel()
+            raise
+        except Exception as e:
+            for item in items:
+                if not item[3].done():
+                    item[3].set_exception(e)
+            return
+
+        for item, response in zip(items, responses):
+            future = item[3]
+            if future.done():
+                continue
+            if isinstance(response, Exception):
+                future.set_exception(response)
+            else:
+                future.set_result(response)
+
+completion_batcher = CompletionBatcher()
+
+# Exact tier keyed by the raw message, near-duplicate tier keyed by the normalized one.
+# Both are namespaced by (model, max_tokens).
+exact_response_cache = ResponseCache()
+normalized_response_cache = ResponseCache()
+
+async def generate_ai_response(message: str, model: str = "openrouter/google/gemini-2.0-flash-exp:free", max_tokens: int = 1024) -> Dict[str, Any]:
     """
     Generate response using litellm, following the pattern from the reference implementation
     """
+    exact_key = (model, max_tokens, message)
+    cached = exact_response_cache.get(exact_key)
+    if cached is not None:
+        return cached
+    normalized_key = (model, max_tokens, normalize_message(message))
+    cached = normalized_response_cache.get(normalized_key)
+    if cached is not None:
+        exact_response_cache.put(exact_key, cached)
+        return cached
+
     try:
         # Prepare messages in the format expected by litellm
         messages = [
             {"role": "user", "content": message}
         ]
         
-        # Call the LLM using litellm completion function
-        response = completion(
-            model=model,
-            messages=messages,
-            max_tokens=max_tokens
-        )
+        # Call the LLM through the batching worker so concurrent requests share a round-trip
+        response = await completion_batcher.submit(model, messages, max_tokens)
         
         # Extract the response content
-        result = response.choices[0].message.content
+        content = response.choices[0].message.content
         
-        return {
-            "response": result,
+        result = {
+            "response": content,
             "model_used": model,
             "tokens_used": response.usage.total_tokens if hasattr(response, 'usage') else None
         }
+        exact_response_cache.put(exact_key, result)
+        normalized_response_cache.put(normalized_key, result)
+        return result
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
+@app.on_event("startup")
+async def start_completion_batcher():
+    """Start the background completion worker"""
+    completion_batcher.start()
+
+@app.on_event("shutdown")
+async def stop_completion_batcher():
+    """Stop the background completion worker and the travel agent HTTP client"""
+    await completion_batcher.stop()
+    if "travel_agent" in sys.modules:
+        await sys.modules["travel_agent"].aclose_http_client()
+
 @app.get("/")
 async def root():
     """Root endpoint with basic information"""
@@ -77,75 +243,215 @@ async def root():
         "description": "Send messages to neural networks using litellm",
         "endpoints": {
             "/chat": "POST - Send a message and get AI response",
+            "/chat/stream": "POST - Send a message and stream the AI response as it is generated",
             "/travel-agent": "POST - Run travel agent with trip purpose interview",
+            "/travel-agent/batch": "POST - Run several travel agent turns in one request",
+            "/travel-agent/stream": "POST - Run travel agent turns and stream memory items as they are produced",
+            "/cache/perplexity/{key}": "DELETE - Drop a cached Perplexity recommendation",
             "/health": "GET - Check API health"
         }
     }
 
-@app.post("/chat", response_model=MessageResponse)
+@app.post("/chat")
 async def chat(request: MessageRequest):
     """
     Accept a message and forward it to the neural network using litellm
     """
     try:
-        result = generate_ai_response(
+        result = await generate_ai_response(
             message=request.message,
             model=request.model,
             max_tokens=request.max_tokens
         )
         
-        return MessageResponse(**result)
+        # result is already a plain dict, serialize it directly without a second Pydantic pass
+        return ORJSONResponse(result)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/travel-agent", response_model=TravelAgentResponse)
+@app.post("/chat/stream")
+async def chat_stream(request: MessageRequest):
+    """
+    Forward a message to the neural network and stream the response tokens back
+    """
+    async def token_stream():
+        response = await get_litellm().acompletion(
+            model=request.model,
+            messages=[{"role": "user", "content": request.message}],
+            max_tokens=request.max_tokens,
+            stream=True
+        )
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    return StreamingResponse(token_stream(), media_type="text/plain; charset=utf-8")
+
+# Keywords that indicate the user wants to start a fresh interview
+NEW_CONVERSATION_RE = re.compile(r"travel|поездка|путешествие|тур|начать|новый|снова", re.IGNORECASE)
+
+# The travel agent keeps a single global conversation state; a turn can suspend while
+# awaiting Perplexity, so turns are serialized to keep that state consistent
+travel_agent_lock = asyncio.Lock()
+
+async def iter_travel_agent_turns(messages: List[str], on_delta: Optional[Callable[[str], None]] = None,
+                                  on_user_item: Optional[Callable[[dict], None]] = None):
+    """
+    Feed user utterances to the travel agent in order, yielding each turn's memory items
+    as soon as that turn completes. on_delta, if given, receives streamed assistant text;
+    on_user_item receives a turn's user item before its handler runs.
+    """
+    async with travel_agent_lock:
+        for message in messages:
+            yield await run_travel_agent_turn(message, on_delta, on_user_item)
+
+async def run_travel_agent_turns(messages: List[str]) -> list:
+    """
+    Feed user utterances to the travel agent in order and return the combined memory items
+    """
+    memory_list = []
+    async for turn_items in iter_travel_agent_turns(messages):
+        memory_list.extend(turn_items)
+    return memory_list
+
+async def run_travel_agent_turn(message: str, on_delta: Optional[Callable[[str], None]] = None,
+                                on_user_item: Optional[Callable[[dict], None]] = None) -> list:
+    """
+    Feed one user utterance to the travel agent and return the resulting memory items
+    """
+    from travel_agent import aprocess_user_response, arun_travel_agent_with_input, agent_state, reset_agent_state
+    
+    # Check if this is a new conversation request (keywords that indicate starting fresh)
+    is_new_conversation = NEW_CONVERSATION_RE.search(message) is not None
+    
+    # Reset state if previous conversation was completed OR if this is a new conversation request
+    if (agent_state.goal_completed or 
+        not agent_state.conversation_active or 
+        is_new_conversation):
+        reset_agent_state()
+    
+    # Check if this is a continuation of an existing conversation
+    if agent_state.current_goal > 1 or (agent_state.current_goal == 1 and agent_state.has_asked_goal_1):
+        # Process user response and advance to next goal
+        final_memory = await aprocess_user_response(message, on_delta, on_user_item)
+    else:
+        # Start new conversation
+        final_memory = await arun_travel_agent_with_input(message, on_delta, on_user_item)
+
+    # Convert memory to list format for JSON response
+    memory_list = []
+    for item in final_memory.get_memories():
+        memory_list.append({
+            "type": item["type"],
+            "content": item["content"]
+        })
+    return memory_list
+
+def travel_agent_status() -> str:
+    """
+    Determine the interview status based on current goal
+    """
+    from travel_agent import agent_state
+    
+    if agent_state.current_goal > 8 or agent_state.goal_completed:
+        return "completed"
+    return "in_progress"
+
+@app.post("/travel-agent")
 async def travel_agent(request: TravelAgentRequest):
     """
     Run the travel agent to interview user about trip purpose
     """
     try:
-        from travel_agent import process_user_response, agent_state, reset_agent_state
-        
-        # Check if this is a new conversation request (keywords that indicate starting fresh)
-        new_conversation_keywords = ["travel", "поездка", "путешествие", "тур", "начать", "новый", "снова"]
-        is_new_conversation = any(keyword in request.message.lower() for keyword in new_conversation_keywords)
-        
-        # Reset state if previous conversation was completed OR if this is a new conversation request
-        if (agent_state.get("goal_completed", False) or 
-            not agent_state.get("conversation_active", True) or 
-            is_new_conversation):
-            reset_agent_state()
-        
-        # Check if this is a continuation of an existing conversation
-        if agent_state["current_goal"] > 1 or (agent_state["current_goal"] == 1 and agent_state.get("has_asked_goal_1", False)):
-            # Process user response and advance to next goal
-            final_memory = process_user_response(request.message)
-        else:
-            # Start new conversation
-            final_memory = run_travel_agent_with_input(request.message)
-
-        # Convert memory to list format for JSON response
-        memory_list = []
-        for item in final_memory.get_memories():
-            memory_list.append({
-                "type": item["type"],
-                "content": item["content"]
-            })
-
-        # Determine status based on current goal
-        if agent_state["current_goal"] > 8 or agent_state.get("goal_completed", False):
-            status = "completed"
-        else:
-            status = "in_progress"
-
-        return TravelAgentResponse(
-            memory=memory_list,
-            status=status
-        )
+        # The Perplexity summary is awaited, so other requests are served in the meantime
+        memory_list = await run_travel_agent_turns([request.message])
+
+        return ORJSONResponse({
+            "memory": memory_list,
+            "status": travel_agent_status()
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error running travel agent: {str(e)}")
 
+@app.post("/travel-agent/batch")
+async def travel_agent_batch(request: TravelAgentBatchRequest):
+    """
+    Run several travel agent turns in one request and return the combined memory
+    """
+    try:
+        memory_list = await run_travel_agent_turns(request.turns)
+
+        return ORJSONResponse({
+            "memory": memory_list,
+            "status": travel_agent_status()
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running travel agent: {str(e)}")
+
+def encode_frame(item: dict) -> bytes:
+    """
+    Encode a memory item as a frame: 8 hex digits of payload length, the JSON payload, newline
+    """
+    payload = orjson.dumps(item)
+    return b"%08x" % len(payload) + payload + b"\n"
+
+@app.post("/travel-agent/stream")
+async def travel_agent_stream(request: TravelAgentBatchRequest):
+    """
+    Run travel agent turns and stream memory items as length-prefixed frames as each turn completes.
+    A turn's user item is sent as soon as the turn starts, and assistant text that is generated
+    incrementally (the trip summary) is sent after it as {"type": "delta"} frames, ahead of the
+    rest of the turn. The last frame is {"type": "status"} or {"type": "error"}.
+    """
+    async def frames():
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            # Number of the current turn's leading items already sent by on_user_item
+            sent_ahead = 0
+
+            def send_user_item(item: dict):
+                nonlocal sent_ahead
+                sent_ahead += 1
+                queue.put_nowait(item)
+
+            try:
+                async for items in iter_travel_agent_turns(
+                    request.turns,
+                    on_delta=lambda chunk: queue.put_nowait({"type": "delta", "content": chunk}),
+                    on_user_item=send_user_item
+                ):
+                    for item in items[sent_ahead:]:
+                        queue.put_nowait(item)
+                    sent_ahead = 0
+                queue.put_nowait({"type": "status", "content": travel_agent_status()})
+            except Exception as e:
+                queue.put_nowait({"type": "error", "content": f"Error running travel agent: {str(e)}"})
+            finally:
+                queue.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while (item := await queue.get()) is not None:
+                yield encode_frame(item)
+        finally:
+            producer.cancel()
+
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+@app.delete("/cache/perplexity/{key}")
+async def invalidate_perplexity_cache(key: str):
+    """
+    Drop a cached Perplexity recommendation so the next summary fetches fresh data
+    """
+    from travel_agent import invalidate_cached_recommendations
+    
+    if not invalidate_cached_recommendations(key):
+        raise HTTPException(status_code=404, detail=f"No cached recommendations for key {key}")
+    return {"status": "deleted", "key": key}
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -153,4 +459,16 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # asyncio already enables TCP_NODELAY on accepted sockets; raise the accept backlog.
+    # The travel agent conversation state and the response caches live in-process,
+    # so more than one worker only makes sense for stateless /chat traffic.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8001,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=int(os.getenv("UVICORN_WORKERS", "1")),
+        backlog=2048,
+        log_level="warning"
+    )
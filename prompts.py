@@ -0,0 +1,86 @@
+"""
+Prompt and question texts for the travel agent.
+
+Every text is interned so all importers share one string object per prompt.
+"""
+
+import string
+import sys
+
+# Static interview questions, returned by reference from the ask_* tools
+Q_TRIP_TYPE = sys.intern("""Какую поездку вы планируете?
+
+Выберите один из следующих вариантов:
+1) Самостоятельная поездка — вы всё организуете сами
+2) Организованный туризм — воспользуйтесь услугами туроператора (рекомендуется)
+3) Деловая поездка
+
+Укажите номер (1, 2 или 3) или полное название варианта.""")
+
+Q_DESTINATION = sys.intern("Какую страну, город или курорт вы хотели бы посетить? Укажите конкретное место назначения.")
+
+Q_GROUP_SIZE = sys.intern("Сколько человек планирует отправиться в эту поездку? Укажите, пожалуйста, количество путешественников.")
+
+Q_TRAVEL_DATES = sys.intern("На какие приблизительные даты вы планируете поездку? Укажите конкретные даты или диапазон дат.")
+
+Q_DEPARTURE_CITY = sys.intern("Из какого города или ближайшего крупного города вы планируете начать путешествие? Укажите, пожалуйста, город отправления.")
+
+Q_USER_FEEDBACK = sys.intern("""Спасибо за предоставленную информацию! 
+
+Я подготовил для вас подробные рекомендации по путешествию на основе ваших предпочтений.
+
+Пожалуйста, оцените, насколько вам понравились предложенные рекомендации:
+
+• Если вам понравилось - напишите что-то вроде "хорошо", "здорово", "супер", "круто", "нравится"
+• Если что-то не понравилось - напишите "не очень", "не нравится" или укажите конкретные проблемы
+
+Ваша обратная связь поможет нам улучшить сервис!""")
+
+Q_NEGATIVE_FEEDBACK = sys.intern("""Понимаю, что рекомендации не полностью соответствуют вашим ожиданиям.
+
+Помогите нам улучшить сервис! Расскажите подробнее:
+
+• Что именно вам не понравилось в рекомендациях?
+• Какая информация была неточной или неактуальной?
+• Что бы вы хотели изменить или добавить?
+• Есть ли конкретные требования, которые мы не учли?
+
+Ваши комментарии помогут нам сделать сервис лучше для будущих пользователей.""")
+
+Q_FEEDBACK_CLARIFICATION = sys.intern("Пожалуйста, уточните ваше мнение. Вам понравились рекомендации или есть что-то, что нужно улучшить?")
+
+Q_HUMAN_AGENT_CONNECTION = sys.intern("""Отлично! Рад, что рекомендации вам понравились! 🎉
+
+Если у вас есть дополнительные вопросы или вы хотите получить более персонализированную помощь, я могу связать вас с нашим живым турагентом.
+
+Наш специалист поможет вам:
+• Уточнить детали поездки
+• Забронировать отели и билеты
+• Ответить на любые вопросы о путешествии
+• Предоставить персональные рекомендации
+
+Хотите ли вы связаться с нашим турагентом? Напишите "да" или "нет".
+
+Спасибо за использование нашего сервиса! ✈️""")
+
+# Perplexity request prompt, filled with the five interview answers
+PERPLEXITY_PROMPT_TEMPLATE = string.Template(sys.intern("""Представьте, что вы профессиональный турагент и собираете заявки на поездку.
+
+По следующим критериям:
+
+Критерий 1 - Тип поездки: $trip_type
+Критерий 2 — Пункт назначения: $destination
+Критерий 3 - Количество человек: $group_size
+Критерий 4 — Даты поездки: $travel_dates
+Критерий 5 - Город отправления: $departure_city
+
+Пожалуйста, предоставьте подробные рекомендации по путешествию, включая:
+
+1. Найдите ссылки из различных источников и других полезных веб-ресурсов, которые могут быть полезны для этой поездки с указанием конкретных дат: https://level.travel, https://sletat.ru/, https://www.aviasales.ru/. Пожалуйста, учитывайте даты в ссылках и подставляйте их из дат поездки.
+
+2. Рекомендации по конкретному месту, как лучше всего провести там время, в соответствии с целью поездки. Опишите советы и лайфхаки, если таковые имеются.
+
+3. Практические советы для данного типа поездки и направления.
+
+Пожалуйста, ответьте на русском языке и предоставьте подробные и практические рекомендации.
+Пожалуйста, также проверяй ссылки которые ты предоставляешь в ответе. Если они не рабочее и по ним ничего не открывается, то просто выдавай ссылку на более общий раздел этого сайта, который открывается."""))
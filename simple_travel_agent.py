@@ -12,13 +12,9 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-def run_simple_travel_agent(user_input: str) -> Dict[str, Any]:
-    """
-    Run a simple travel agent that interviews the user about trip purpose
-    """
-    
-    # System prompt for the travel agent
-    system_prompt = """You are a travel agent with two main goals:
+# System prompt for the travel agent; kept byte-identical across calls so
+# providers can reuse their prompt-prefix cache
+SYSTEM_PROMPT = """You are a travel agent with two main goals:
 1. Interview the user about the purpose of their trip
 2. Terminate the conversation after gathering the information
 
@@ -30,9 +26,16 @@ Then end the conversation with:
 
 Keep your responses concise and focused on these two goals."""
 
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+def run_simple_travel_agent(user_input: str) -> Dict[str, Any]:
+    """
+    Run a simple travel agent that interviews the user about trip purpose
+    """
+    
     # Create the conversation
     messages = [
-        {"role": "system", "content": system_prompt},
+        SYSTEM_MESSAGE,
         {"role": "user", "content": user_input}
     ]
     
@@ -4,28 +4,28 @@ Test script to verify the AI Talk Travel Agent setup
 """
 
 import sys
-import importlib
+import importlib.util
 
 def test_imports():
     """Test if all required packages can be imported"""
+    # (distribution name, import name) - python-dotenv is imported as dotenv
     required_packages = [
-        'fastapi',
-        'uvicorn', 
-        'litellm',
-        'python-dotenv',
-        'pydantic',
-        'requests'
+        ('fastapi', 'fastapi'),
+        ('uvicorn', 'uvicorn'),
+        ('litellm', 'litellm'),
+        ('python-dotenv', 'dotenv'),
+        ('pydantic', 'pydantic'),
+        ('requests', 'requests')
     ]
     
     print("🔍 Testing package imports...")
     
-    for package in required_packages:
-        try:
-            importlib.import_module(package)
-            print(f"✅ {package}")
-        except ImportError as e:
-            print(f"❌ {package}: {e}")
+    # find_spec locates the package without executing its top-level code
+    for package, module in required_packages:
+        if importlib.util.find_spec(module) is None:
+            print(f"❌ {package}: module '{module}' not found")
             return False
+        print(f"✅ {package}")
     
     return True
 
@@ -66,6 +66,40 @@ def test_fastapi_app():
         print(f"❌ Failed to create FastAPI app: {e}")
         return False
 
+def test_feedback_sentiment():
+    """Test that feedback sentiment handles negated answers"""
+    print("\n🔍 Testing feedback sentiment...")
+    
+    # (feedback, expected sentiment) - negations must outweigh the positive word they negate
+    cases = [
+        ("не очень хорошо", "negative"),
+        ("не очень понравилось", "negative"),
+        ("не очень подходит", "negative"),
+        ("мне не очень нравится", "negative"),
+        ("Да, но не очень", "negative"),
+        ("нет, спасибо", "negative"),
+        ("Супер, спасибо!", "positive"),
+        ("да", "positive"),
+        ("когда", "neutral"),
+    ]
+    
+    try:
+        from travel_agent import analyze_feedback_sentiment
+    except Exception as e:
+        print(f"❌ Failed to import travel agent: {e}")
+        return False
+    
+    all_passed = True
+    for feedback, expected in cases:
+        sentiment = analyze_feedback_sentiment(feedback)
+        if sentiment != expected:
+            print(f"❌ {feedback!r}: expected {expected}, got {sentiment}")
+            all_passed = False
+    
+    if all_passed:
+        print("✅ Feedback sentiment looks good")
+    return all_passed
+
 def main():
     """Run all tests"""
     print("🧪 AI Talk Travel Agent - Setup Test")
@@ -74,7 +108,8 @@ def main():
     tests = [
         test_imports,
         test_env_file,
-        test_fastapi_app
+        test_fastapi_app,
+        test_feedback_sentiment
     ]
     
     all_passed = True
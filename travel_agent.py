@@ -5,53 +5,101 @@ This agent conducts a structured interview with users about their travel prefere
 and includes error handling for invalid responses.
 """
 
-import importlib
+import functools
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from typing import List, Dict, Any
-from dotenv import load_dotenv
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional, Tuple
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Import the Game framework
-import game.core
-importlib.reload(game.core)
+if os.getenv("DEV_RELOAD") == "1":
+    # Pick up edits to game.core when re-running in an interactive session
+    import importlib
+    import game.core
+    importlib.reload(game.core)
 from game.core import Environment, Goal, register_tool, PythonActionRegistry, Agent, \
-    AgentFunctionCallingActionLanguage, generate_response
+    AgentFunctionCallingActionLanguage, Prompt, Memory, generate_response, normalize_message, write_tool_manifest, \
+    TOOLS_FROM_MANIFEST
+from prompts import Q_TRIP_TYPE, Q_DESTINATION, Q_GROUP_SIZE, Q_TRAVEL_DATES, Q_DEPARTURE_CITY, \
+    Q_USER_FEEDBACK, Q_NEGATIVE_FEEDBACK, Q_FEEDBACK_CLARIFICATION, Q_HUMAN_AGENT_CONNECTION, \
+    PERPLEXITY_PROMPT_TEMPLATE
 
-# Load environment variables from .env file
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Configure litellm for OpenRouter function calling
-import litellm
-litellm.set_verbose=True
-# Note: add_function_to_prompt can cause issues with newer litellm versions
-# litellm.add_function_to_prompt = True
+# dotenv and litellm are imported on first use so paths that never reach the LLM start fast
+_ENV_LOADED = False
+_LLM_READY = False
+
+def _ensure_env_loaded():
+    """Load environment variables from the .env file once"""
+    global _ENV_LOADED
+    if _ENV_LOADED:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _ENV_LOADED = True
+
+def _log_llm_latency(kwargs, completion_response, start_time, end_time):
+    """litellm success callback: log the model and wall-clock latency of each call"""
+    logger.debug("LLM call to %s took %.3fs", kwargs.get("model"), (end_time - start_time).total_seconds())
+
+def _ensure_llm_initialized():
+    """Configure litellm for OpenRouter function calling once"""
+    global _LLM_READY
+    if _LLM_READY:
+        return
+    _ensure_env_loaded()
+    import litellm
+    # Verbose logging dumps every request/response to stderr, keep it opt-in
+    if os.getenv("LITELLM_VERBOSE") == "1":
+        litellm.set_verbose = True
+    # Per-call latency is cheap to record, but only worth a callback when debug logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        litellm.success_callback.append(_log_llm_latency)
+    _LLM_READY = True
+
+# user_responses keys, interned so every per-turn dict lookup hits the identity fast path
+_K_TRIP_TYPE = sys.intern("trip_type")
+_K_DESTINATION = sys.intern("destination")
+_K_GROUP_SIZE = sys.intern("group_size")
+_K_TRAVEL_DATES = sys.intern("travel_dates")
+_K_DEPARTURE_CITY = sys.intern("departure_city")
+_K_FEEDBACK = sys.intern("feedback")
+_K_HUMAN_AGENT_REQUEST = sys.intern("human_agent_request")
+
+@dataclass(slots=True)
+class AgentState:
+    """State of the current travel planning conversation"""
+    current_goal: int = 1
+    user_responses: Dict[str, str] = field(default_factory=dict)
+    error_count: int = 0
+    max_errors: int = 3
+    goal_completed: bool = False
+    conversation_active: bool = True
+    has_asked_goal_1: bool = False
 
 # Global state to track current goal and user responses
-agent_state = {
-    "current_goal": 1,
-    "user_responses": {},
-    "error_count": 0,
-    "max_errors": 3,
-    "goal_completed": False,
-    "conversation_active": True,
-    "has_asked_goal_1": False
-}
+agent_state = AgentState()
 
 def reset_agent_state():
     """Reset the agent state for a new conversation"""
-    global agent_state
-    print(f"🔄 Resetting agent state for new conversation")
-    # Clear the existing state
-    agent_state.clear()
-    # Set new values
-    agent_state.update({
-        "current_goal": 1,
-        "user_responses": {},
-        "error_count": 0,
-        "max_errors": 3,
-        "goal_completed": False,
-        "conversation_active": True,
-        "has_asked_goal_1": False
-    })
+    logger.debug("Resetting agent state for new conversation")
+    # Reset in place so every holder of agent_state sees the new conversation
+    AgentState.__init__(agent_state)
 
 # Define the main goal for the travel agent - sequential execution
 goals = [
@@ -80,26 +128,7 @@ def execute_sequential_travel_planning() -> str:
     Returns:
         The appropriate question or response based on current goal
     """
-    current_goal = agent_state["current_goal"]
-    
-    if current_goal == 1:
-        return ask_trip_type()
-    elif current_goal == 2:
-        return ask_destination()
-    elif current_goal == 3:
-        return ask_group_size()
-    elif current_goal == 4:
-        return ask_travel_dates()
-    elif current_goal == 5:
-        return ask_departure_city()
-    elif current_goal == 6:
-        return generate_travel_summary()
-    elif current_goal == 7:
-        return ask_user_feedback()
-    elif current_goal == 8:
-        return offer_human_agent_connection()
-    else:
-        return "Travel planning session completed. Thank you!"
+    return run_goal_handler(agent_state.current_goal)
 
 @register_tool(tags=["interview", "goal_1"])
 def ask_trip_type() -> str:
@@ -108,14 +137,7 @@ def ask_trip_type() -> str:
     Returns:
         A message asking about trip type with three options
     """
-    return """Какую поездку вы планируете?
-
-Выберите один из следующих вариантов:
-1) Самостоятельная поездка — вы всё организуете сами
-2) Организованный туризм — воспользуйтесь услугами туроператора (рекомендуется)
-3) Деловая поездка
-
-Укажите номер (1, 2 или 3) или полное название варианта."""
+    return Q_TRIP_TYPE
 
 @register_tool(tags=["interview", "goal_2"])
 def ask_destination() -> str:
@@ -124,7 +146,7 @@ def ask_destination() -> str:
     Returns:
         A message asking about destination
     """
-    return "Какую страну, город или курорт вы хотели бы посетить? Укажите конкретное место назначения."
+    return Q_DESTINATION
 
 @register_tool(tags=["interview", "goal_3"])
 def ask_group_size() -> str:
@@ -133,7 +155,7 @@ def ask_group_size() -> str:
     Returns:
         A message asking about group size
     """
-    return "Сколько человек планирует отправиться в эту поездку? Укажите, пожалуйста, количество путешественников."
+    return Q_GROUP_SIZE
 
 @register_tool(tags=["interview", "goal_4"])
 def ask_travel_dates() -> str:
@@ -142,7 +164,7 @@ def ask_travel_dates() -> str:
     Returns:
         A message asking about travel dates
     """
-    return "На какие приблизительные даты вы планируете поездку? Укажите конкретные даты или диапазон дат."
+    return Q_TRAVEL_DATES
 
 @register_tool(tags=["interview", "goal_5"])
 def ask_departure_city() -> str:
@@ -151,92 +173,218 @@ def ask_departure_city() -> str:
     Returns:
         A message asking about departure city
     """
-    return "Из какого города или ближайшего крупного города вы планируете начать путешествие? Укажите, пожалуйста, город отправления."
+    return Q_DEPARTURE_CITY
 
-def get_perplexity_recommendations(trip_type: str, destination: str, group_size: str, travel_dates: str, departure_city: str) -> str:
-    """Get travel recommendations from Perplexity API.
+# Perplexity recommendations keyed by perplexity_cache_key(), stored as (timestamp, response).
+# Popular destinations recur, so when full the least frequently used entry is evicted.
+# Travel offers go stale within about a day, so entries live for 24 hours
+PERPLEXITY_CACHE_TTL = 86400
+PERPLEXITY_CACHE_MAXSIZE = 1024
+# Entries are kept least recently used first
+PERPLEXITY_CACHE: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+# LFU with dynamic aging: an entry scores the cache age at insertion plus its hits, and the
+# age rises to the score of each evicted entry, so new entries are not evicted before
+# long-idle popular ones. Ties go to the least recently used entry.
+PERPLEXITY_CACHE_SCORES: Dict[str, int] = {}
+_perplexity_cache_age = 0
+# Batch runs use the cache from several threads at once
+_PERPLEXITY_CACHE_LOCK = threading.Lock()
+
+def perplexity_cache_key(trip_type: str, destination: str, group_size: str, travel_dates: str, departure_city: str) -> str:
+    """Build the cache key for a set of trip parameters.
+    
+    Parameters are casefolded and whitespace-collapsed first, so answers that differ
+    only in case or spacing ("Париж" / " париж ") share one entry.
+    
+    Returns:
+        128-bit BLAKE2b hex digest of the normalized trip parameters
+    """
+    params = (trip_type, destination, group_size, travel_dates, departure_city)
+    raw = "\x1f".join(" ".join(param.casefold().split()) for param in params)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+def get_cached_recommendations(key: str) -> Optional[str]:
+    """Return cached recommendations for a key if they have not expired.
     
     Args:
-        trip_type: Type of trip (organized/independent/business)
-        destination: Travel destination
-        group_size: Number of travelers
-        travel_dates: Travel dates
-        departure_city: Departure city
+        key: Key produced by perplexity_cache_key
         
     Returns:
-        Formatted recommendations from Perplexity
+        The cached formatted recommendations, or None on a miss
+    """
+    with _PERPLEXITY_CACHE_LOCK:
+        entry = PERPLEXITY_CACHE.get(key)
+        if entry is None:
+            return None
+        stored_at, recommendations = entry
+        if time.time() - stored_at >= PERPLEXITY_CACHE_TTL:
+            _drop_cached_recommendations(key)
+            return None
+        PERPLEXITY_CACHE_SCORES[key] += 1
+        PERPLEXITY_CACHE.move_to_end(key)
+        return recommendations
+
+def store_cached_recommendations(key: str, recommendations: str):
+    """Cache recommendations, evicting expired entries and then the lowest scoring one when full.
+    
+    Args:
+        key: Key produced by perplexity_cache_key
+        recommendations: Formatted recommendations to cache
+    """
+    global _perplexity_cache_age
+    with _PERPLEXITY_CACHE_LOCK:
+        now = time.time()
+        if key not in PERPLEXITY_CACHE and len(PERPLEXITY_CACHE) >= PERPLEXITY_CACHE_MAXSIZE:
+            expired = [k for k, (stored_at, _) in PERPLEXITY_CACHE.items() if now - stored_at >= PERPLEXITY_CACHE_TTL]
+            for expired_key in expired:
+                _drop_cached_recommendations(expired_key)
+            if not expired:
+                # min() keeps the first of equal scores, which is the least recently used
+                evicted = min(PERPLEXITY_CACHE, key=PERPLEXITY_CACHE_SCORES.__getitem__)
+                _perplexity_cache_age = PERPLEXITY_CACHE_SCORES[evicted]
+                _drop_cached_recommendations(evicted)
+        PERPLEXITY_CACHE[key] = (now, recommendations)
+        PERPLEXITY_CACHE.move_to_end(key)
+        PERPLEXITY_CACHE_SCORES.setdefault(key, _perplexity_cache_age)
+
+def _drop_cached_recommendations(key: str) -> bool:
+    """Remove an entry; the caller holds _PERPLEXITY_CACHE_LOCK"""
+    PERPLEXITY_CACHE_SCORES.pop(key, None)
+    return PERPLEXITY_CACHE.pop(key, None) is not None
+
+def invalidate_cached_recommendations(key: str) -> bool:
+    """Drop cached recommendations for a key.
+    
+    Args:
+        key: Key produced by perplexity_cache_key
+        
+    Returns:
+        True if an entry was removed
+    """
+    with _PERPLEXITY_CACHE_LOCK:
+        return _drop_cached_recommendations(key)
+
+@functools.lru_cache(maxsize=None)
+def _perplexity_headers() -> Optional[Dict[str, str]]:
+    """Build the Perplexity request headers once from PERPLEXITY_API_KEY.
+    
+    Returns:
+        The headers, or None if no API key is configured
     """
-    import requests
-    import os
+    _ensure_env_loaded()
     
-    # Get API key from environment
     api_key = os.getenv("PERPLEXITY_API_KEY")
     if not api_key:
-        # Fallback to hardcoded key for testing (remove in production)
-        api_key = ""
-        if not api_key:
-            # Debug information
-            all_env_vars = {k: v for k, v in os.environ.items() if 'PERPLEXITY' in k or 'API' in k}
-            debug_info = f"Доступные переменные окружения: {list(all_env_vars.keys())}"
-            return f"❌ API ключ не найден. Пожалуйста, проверьте настройки.\n{debug_info}"
+        return None
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+def _missing_api_key_message() -> str:
+    message = "❌ API ключ не найден. Пожалуйста, проверьте настройки."
+    if os.getenv("DEBUG"):
+        # List the candidate variables to help spot a misnamed key
+        candidates = [k for k in os.environ if 'PERPLEXITY' in k or 'API' in k]
+        message += f"\nДоступные переменные окружения: {candidates}"
+    return message
+
+def _perplexity_request(trip_type: str, destination: str, group_size: str, travel_dates: str, departure_city: str) -> Dict[str, Any]:
+    """Build the body of a Perplexity chat completion request.
     
+    Returns:
+        The JSON request body
+    """
     # Construct the prompt according to requirements
-    prompt = f"""Представьте, что вы профессиональный турагент и собираете заявки на поездку.
-
-По следующим критериям:
+    prompt = PERPLEXITY_PROMPT_TEMPLATE.substitute(
+        trip_type=trip_type,
+        destination=destination,
+        group_size=group_size,
+        travel_dates=travel_dates,
+        departure_city=departure_city
+    )
 
-Критерий 1 - Тип поездки: {trip_type}
-Критерий 2 — Пункт назначения: {destination}
-Критерий 3 - Количество человек: {group_size}
-Критерий 4 — Даты поездки: {travel_dates}
-Критерий 5 - Город отправления: {departure_city}
+    data = {
+        "model": "sonar",  # Valid model with web search capabilities
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "max_tokens": 2000,
+        "temperature": 0.2
+    }
+    
+    return data
 
-Пожалуйста, предоставьте подробные рекомендации по путешествию, включая:
+_RECOMMENDATIONS_HEADER = "🎯 РЕКОМЕНДАЦИИ ОТ ПРОФЕССИОНАЛЬНОГО ТУРАГЕНТА:\n\n"
 
-1. Найдите ссылки из различных источников и других полезных веб-ресурсов, которые могут быть полезны для этой поездки с указанием конкретных дат: https://level.travel, https://sletat.ru/, https://www.aviasales.ru/. Пожалуйста, учитывайте даты в ссылках и подставляйте их из дат поездки.
+def _format_recommendations(result: Dict[str, Any]) -> str:
+    """Format a successful Perplexity response for the summary"""
+    content = result["choices"][0]["message"]["content"]
+    
+    return _RECOMMENDATIONS_HEADER + content
 
-2. Рекомендации по конкретному месту, как лучше всего провести там время, в соответствии с целью поездки. Опишите советы и лайфхаки, если таковые имеются.
+PERPLEXITY_URL = "https://api.perplexity.ai/chat/completions"
+# Fail fast when the API is unreachable, but leave room for a long completion
+PERPLEXITY_TIMEOUT = (5, 30)
 
-3. Практические советы для данного типа поездки и направления.
+@functools.lru_cache(maxsize=None)
+def _get_requests_session():
+    """Return the shared requests session, creating it on first use.
+    
+    Pooling keeps the TLS connection to Perplexity open across summaries, and
+    transient 429/5xx responses are retried with backoff.
+    """
+    retry = Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        # Hand the last error response back so it is reported like any other API error
+        raise_on_status=False
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry))
+    return session
 
-Пожалуйста, ответьте на русском языке и предоставьте подробные и практические рекомендации.
-Пожалуйста, также проверяй ссылки которые ты предоставляешь в ответе. Если они не рабочее и по ним ничего не открывается, то просто выдавай ссылку на более общий раздел этого сайта, который открывается."""
+def get_perplexity_recommendations(trip_type: str, destination: str, group_size: str, travel_dates: str, departure_city: str) -> str:
+    """Get travel recommendations from Perplexity API.
+    
+    Args:
+        trip_type: Type of trip (organized/independent/business)
+        destination: Travel destination
+        group_size: Number of travelers
+        travel_dates: Travel dates
+        departure_city: Departure city
+        
+    Returns:
+        Formatted recommendations from Perplexity
+    """
+    cache_key = perplexity_cache_key(trip_type, destination, group_size, travel_dates, departure_city)
+    cached = get_cached_recommendations(cache_key)
+    if cached is not None:
+        return cached
+    
+    headers = _perplexity_headers()
+    if headers is None:
+        return _missing_api_key_message()
 
     try:
         # Make request to Perplexity API using the cheapest model
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        data = _perplexity_request(trip_type, destination, group_size, travel_dates, departure_city)
         
-        data = {
-            "model": "sonar",  # Valid model with web search capabilities
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "max_tokens": 2000,
-            "temperature": 0.2
-        }
-        
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
+        response = _get_requests_session().post(
+            PERPLEXITY_URL,
             headers=headers,
             json=data,
-            timeout=30
+            timeout=PERPLEXITY_TIMEOUT
         )
         
         if response.status_code == 200:
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
-            
-            # Format the response nicely
-            formatted_response = "🎯 РЕКОМЕНДАЦИИ ОТ ПРОФЕССИОНАЛЬНОГО ТУРАГЕНТА:\n\n"
-            formatted_response += content
-            #formatted_response += "\n\n📋 Источник: Perplexity AI с веб-поиском"
-            
+            formatted_response = _format_recommendations(response.json())
+            store_cached_recommendations(cache_key, formatted_response)
             return formatted_response
         else:
             return f"❌ Ошибка API: {response.status_code} - {response.text}"
@@ -248,6 +396,149 @@ def get_perplexity_recommendations(trip_type: str, destination: str, group_size:
     except Exception as e:
         return f"❌ Неожиданная ошибка: {str(e)}"
 
+# Shared async HTTP client so concurrent summaries reuse pooled HTTP/2 connections
+_http_client = None
+# Seconds an idle pooled connection is kept, long enough for the user to answer the last question
+PERPLEXITY_KEEPALIVE_EXPIRY = 120
+
+def _get_http_client():
+    """Return the shared async HTTP client, creating it on first use"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        connect_timeout, read_timeout = PERPLEXITY_TIMEOUT
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            # The default 5 s expiry would close a warmed connection before the summary is requested
+            limits=httpx.Limits(keepalive_expiry=PERPLEXITY_KEEPALIVE_EXPIRY),
+            http2=True
+        )
+    return _http_client
+
+async def aclose_http_client():
+    """Close the shared async HTTP client"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# Once this goal is answered the next answer triggers the summary, so the connection to
+# Perplexity is opened while the user answers the last question (the query needs all five answers)
+PERPLEXITY_WARMUP_GOAL = 4
+PERPLEXITY_ORIGIN = "https://api.perplexity.ai/"
+_background_tasks = set()
+
+async def _warm_perplexity_connection():
+    """Open the pooled connection to Perplexity so the summary request skips TCP/TLS setup"""
+    try:
+        # Any response opens the connection; the origin keeps the probe off the API endpoint
+        await _get_http_client().head(PERPLEXITY_ORIGIN)
+    except Exception as e:
+        logger.debug("Perplexity connection warm-up failed: %s", e)
+
+def schedule_perplexity_warmup():
+    """Warm the Perplexity connection in the background of the current event loop"""
+    if _perplexity_headers() is None:
+        # Without an API key the summary never reaches Perplexity
+        return
+    task = asyncio.get_running_loop().create_task(_warm_perplexity_connection())
+    # Keep a reference so the task is not garbage collected before it finishes
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def astream_perplexity_recommendations(trip_type: str, destination: str, group_size: str, travel_dates: str, departure_city: str) -> AsyncIterator[str]:
+    """Stream travel recommendations from Perplexity API as they are generated.
+    
+    Same arguments, caching and error messages as get_perplexity_recommendations.
+    A cached response is yielded whole; otherwise the completion is requested with
+    stream=True and each content delta is yielded as it arrives.
+    
+    Yields:
+        Chunks of the formatted recommendations
+    """
+    cache_key = perplexity_cache_key(trip_type, destination, group_size, travel_dates, departure_city)
+    cached = get_cached_recommendations(cache_key)
+    if cached is not None:
+        yield cached
+        return
+    
+    headers = _perplexity_headers()
+    if headers is None:
+        yield _missing_api_key_message()
+        return
+    
+    try:
+        data = _perplexity_request(trip_type, destination, group_size, travel_dates, departure_city)
+        data["stream"] = True
+        
+        async with _get_http_client().stream("POST", PERPLEXITY_URL, headers=headers, json=data) as response:
+            if response.status_code != 200:
+                await response.aread()
+                yield f"❌ Ошибка API: {response.status_code} - {response.text}"
+                return
+            
+            parts = [_RECOMMENDATIONS_HEADER]
+            yield _RECOMMENDATIONS_HEADER
+            # Server-sent events: one "data: {json}" line per delta, "data: [DONE]" at the end
+            async for line in response.aiter_lines():
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                content = json.loads(line[6:])["choices"][0]["delta"].get("content")
+                if content:
+                    parts.append(content)
+                    yield content
+        
+        store_cached_recommendations(cache_key, "".join(parts))
+    
+    except httpx.TimeoutException:
+        yield "❌ Превышено время ожидания ответа от API. Попробуйте позже."
+    except httpx.HTTPError as e:
+        yield f"❌ Ошибка соединения с API: {str(e)}"
+    except Exception as e:
+        yield f"❌ Неожиданная ошибка: {str(e)}"
+
+# Display labels for the numbered trip type options
+_TRIP_TYPE_LABELS = {
+    "1": "Самостоятельная поездка",
+    "2": "Организованный туризм с использованием услуг туроператора",
+    "3": "Командировка",
+}
+
+# Free-text answers are matched on the first keyword found, in this order
+_TRIP_TYPE_KEYWORDS = (
+    ("organized", _TRIP_TYPE_LABELS["2"]),
+    ("independent", _TRIP_TYPE_LABELS["1"]),
+    ("business", _TRIP_TYPE_LABELS["3"]),
+)
+
+def classify_trip_type(trip_type: str) -> Optional[str]:
+    """Map a trip type answer to its display label.
+    
+    Args:
+        trip_type: The option number or a free-text answer
+        
+    Returns:
+        The display label, or None if the answer matches no known trip type
+    """
+    label = _TRIP_TYPE_LABELS.get(trip_type)
+    if label is None:
+        # Free-text answer: lowercase once and reuse it for every keyword test
+        trip_type_lower = trip_type.lower()
+        label = next((candidate for keyword, candidate in _TRIP_TYPE_KEYWORDS if keyword in trip_type_lower), None)
+    return label
+
+_SUMMARY_SEARCHING_BANNER = "\n" + "=" * 60 + "\n🔍 ИЩЕМ, ДУМАЕМ, ЛОВИМ СЛОТЫ...\n" + "=" * 60 + "\n\n"
+_SUMMARY_FOOTER = "\n" + "=" * 60 + "\nЖелаю вам счастливого пути! 🎉"
+
+# Summary header, filled from the answers with format_map; missing answers read "Not specified"
+_SUMMARY_TEMPLATE = (
+    "Уважаемый турист, вы ввели следующую информацию:\n\n"
+    "• {trip_type_title}: {trip_type_label}\n"
+    "• Место назначения: {destination}\n"
+    "• Количество человек: {group_size}\n"
+    "• Даты поездки: {travel_dates}\n"
+    "• Город отправления: {departure_city}\n"
+) + _SUMMARY_SEARCHING_BANNER
+
 @register_tool(tags=["summary", "goal_6"])
 def generate_travel_summary() -> str:
     """Generate a comprehensive travel summary with Perplexity recommendations.
@@ -255,61 +546,112 @@ def generate_travel_summary() -> str:
     Returns:
         A formatted summary with travel recommendations from Perplexity
     """
-    responses = agent_state["user_responses"]
-    
-    # Basic summary
-    summary = "Уважаемый турист, вы ввели следующую информацию:\n\n"
-    
-    # Add trip type information
-    trip_type = responses.get("trip_type", "Not specified")
-    trip_type_display = ""
-    if trip_type == "2" or "organized" in trip_type.lower():
-        trip_type_display = "Организованный туризм с использованием услуг туроператора"
-        summary += "• Вы выбрали: Организованный туризм с использованием услуг туроператора\n"
-    elif trip_type == "1" or "independent" in trip_type.lower():
-        trip_type_display = "Самостоятельная поездка"
-        summary += "• Вы выбрали: Самостоятельная поездка\n"
-    elif trip_type == "3" or "business" in trip_type.lower():
-        trip_type_display = "Командировка"
-        summary += "• Вы выбрали: Командировка\n"
-    else:
-        trip_type_display = trip_type
-        summary += f"• Тип поездки: {trip_type}\n"
-    
-    # Add destination information
-    destination = responses.get("destination", "Not specified")
-    summary += f"• Место назначения: {destination}\n"
+    return build_travel_summary(agent_state.user_responses)
+
+def _summary_header(responses: Dict[str, str]) -> Tuple[str, Tuple[str, ...]]:
+    """Render the summary header and collect the Perplexity query parameters.
     
-    # Add group size information
-    group_size = responses.get("group_size", "Not specified")
-    summary += f"• Количество человек: {group_size}\n"
+    Returns:
+        The header text and the (trip_type, destination, group_size, travel_dates, departure_city) tuple
+    """
+    context = defaultdict(lambda: "Not specified", responses)
     
-    # Add travel dates information
-    travel_dates = responses.get("travel_dates", "Not specified")
-    summary += f"• Даты поездки: {travel_dates}\n"
+    # Known trip types are shown by label, anything else as the user typed it
+    trip_type = context[_K_TRIP_TYPE]
+    trip_type_label = classify_trip_type(trip_type)
+    if trip_type_label is None:
+        context["trip_type_title"] = "Тип поездки"
+        context["trip_type_label"] = trip_type
+    else:
+        context["trip_type_title"] = "Вы выбрали"
+        context["trip_type_label"] = trip_type_label
     
-    # Add departure city information
-    departure_city = responses.get("departure_city", "Not specified")
-    summary += f"• Город отправления: {departure_city}\n"
+    params = (context["trip_type_label"], context[_K_DESTINATION], context[_K_GROUP_SIZE],
+              context[_K_TRAVEL_DATES], context[_K_DEPARTURE_CITY])
+    return _SUMMARY_TEMPLATE.format_map(context), params
+
+def _summary_error(e: Exception) -> str:
+    return (f"❌ Ошибка при получении рекомендаций: {str(e)}\n"
+            "Пожалуйста, попробуйте позже или обратитесь в службу поддержки.\n")
+
+def build_travel_summary(responses: Dict[str, str]) -> str:
+    """Build the travel summary for a set of interview answers.
     
-    summary += "\n" + "="*60 + "\n"
-    summary += "🔍 ИЩЕМ, ДУМАЕМ, ЛОВИМ СЛОТЫ...\n"
-    summary += "="*60 + "\n\n"
+    Args:
+        responses: Answers keyed by trip_type, destination, group_size, travel_dates, departure_city
+        
+    Returns:
+        A formatted summary with travel recommendations from Perplexity
+    """
+    header, params = _summary_header(responses)
     
     # Get Perplexity recommendations
     try:
-        perplexity_response = get_perplexity_recommendations(
-            trip_type_display, destination, group_size, travel_dates, departure_city
-        )
-        summary += perplexity_response
+        perplexity_response = get_perplexity_recommendations(*params)
     except Exception as e:
-        summary += f"❌ Ошибка при получении рекомендаций: {str(e)}\n"
-        summary += "Пожалуйста, попробуйте позже или обратитесь в службу поддержки.\n"
+        perplexity_response = _summary_error(e)
     
-    summary += "\n" + "="*60 + "\n"
-    summary += "Желаю вам счастливого пути! 🎉"
+    return "".join((header, perplexity_response, _SUMMARY_FOOTER))
+
+async def astream_travel_summary(responses: Dict[str, str]) -> AsyncIterator[str]:
+    """Stream the travel summary: the header, the recommendations as they arrive, the footer"""
+    header, params = _summary_header(responses)
+    yield header
+    
+    try:
+        async for chunk in astream_perplexity_recommendations(*params):
+            yield chunk
+    except Exception as e:
+        yield _summary_error(e)
     
-    return summary
+    yield _SUMMARY_FOOTER
+
+async def abuild_travel_summary(responses: Dict[str, str], on_delta: Optional[Callable[[str], None]] = None) -> str:
+    """Async variant of build_travel_summary that streams the Perplexity request.
+    
+    Args:
+        responses: Answers keyed by trip_type, destination, group_size, travel_dates, departure_city
+        on_delta: Called with each chunk of the summary as soon as it is available
+        
+    Returns:
+        The complete summary
+    """
+    parts = []
+    async for chunk in astream_travel_summary(responses):
+        if on_delta:
+            on_delta(chunk)
+        parts.append(chunk)
+    return "".join(parts)
+
+# Sentiment indicators for the feedback step
+_POSITIVE_WORDS = frozenset([
+    "хорошо", "здорово", "супер", "круто", "нравится", "отлично", 
+    "прекрасно", "замечательно", "великолепно", "потрясающе", 
+    "спасибо", "благодарю", "понравилось", "подходит", "устраивает",
+    "да", "согласен", "принимаю", "беру"
+])
+_NEGATIVE_WORDS = frozenset([
+    "не очень", "не нравится", "говно", "лажа", "плохо", "ужасно",
+    "не подходит", "не устраивает", "не то", "неправильно", 
+    "неверно", "неточно", "неактуально",
+    "не", "нет", "отказываюсь", "не хочу", "не буду"
+])
+
+# A negation in front of a positive word ("не очень хорошо", "не понравилось") is one negative indicator
+_NEGATION_PREFIXES = ("не", "не очень")
+
+# Each positive indicator scores +1 and each negative one -2, so a negation outweighs a positive
+# word in the same answer ("да, но не очень", "нет, спасибо"); the sentiment is the sign of the sum
+_SENTIMENT_WEIGHTS = {word: 1 for word in _POSITIVE_WORDS}
+_SENTIMENT_WEIGHTS.update((word, -2) for word in _NEGATIVE_WORDS)
+_SENTIMENT_WEIGHTS.update((f"{prefix} {word}", -2) for prefix in _NEGATION_PREFIXES for word in _POSITIVE_WORDS)
+
+# Every indicator in one alternation, longest first, so a single scan takes the longest
+# phrase at each position ("не нравится" is counted as negative, not as "не" + "нравится").
+# Word boundaries keep short indicators from matching inside words ("да" in "когда").
+_SENTIMENT_RE = re.compile(r"\b(?:" + "|".join(
+    re.escape(word) for word in sorted(_SENTIMENT_WEIGHTS, key=len, reverse=True)
+) + r")\b")
 
 def analyze_feedback_sentiment(user_feedback: str) -> str:
     """Analyze user feedback to determine if it's positive or negative.
@@ -320,33 +662,19 @@ def analyze_feedback_sentiment(user_feedback: str) -> str:
     Returns:
         'positive', 'negative', or 'neutral'
     """
-    feedback_lower = user_feedback.lower()
-    
-    # Positive sentiment indicators
-    positive_words = [
-        "хорошо", "здорово", "супер", "круто", "нравится", "отлично", 
-        "прекрасно", "замечательно", "великолепно", "потрясающе", 
-        "спасибо", "благодарю", "понравилось", "подходит", "устраивает",
-        "да", "согласен", "принимаю", "беру"
-    ]
+    # Normalize once (single spaces between words); every match is then already in the indicators' form
+    text = " ".join(unicodedata.normalize("NFKC", user_feedback).casefold().split())
     
-    # Negative sentiment indicators
-    negative_words = [
-        "не очень", "не нравится", "говно", "лажа", "плохо", "ужасно",
-        "не подходит", "не устраивает", "не то", "неправильно", 
-        "неверно", "неточно", "неактуально", "не подходит", "не подходит",
-        "не", "нет", "отказываюсь", "не хочу", "не буду"
-    ]
+    # Most answers are a single indicator ("да", "нет", "плохо"): one lookup, no scan
+    weight = _SENTIMENT_WEIGHTS.get(text)
+    if weight is not None:
+        return "positive" if weight > 0 else "negative"
     
-    # Check for positive sentiment
-    positive_count = sum(1 for word in positive_words if word in feedback_lower)
+    score = sum(_SENTIMENT_WEIGHTS[word] for word in _SENTIMENT_RE.findall(text))
     
-    # Check for negative sentiment
-    negative_count = sum(1 for word in negative_words if word in feedback_lower)
-    
-    if positive_count > negative_count:
+    if score > 0:
         return "positive"
-    elif negative_count > positive_count:
+    elif score < 0:
         return "negative"
     else:
         return "neutral"
@@ -358,16 +686,7 @@ def ask_user_feedback() -> str:
     Returns:
         A message asking for user feedback on the recommendations
     """
-    return """Спасибо за предоставленную информацию! 
-
-Я подготовил для вас подробные рекомендации по путешествию на основе ваших предпочтений.
-
-Пожалуйста, оцените, насколько вам понравились предложенные рекомендации:
-
-• Если вам понравилось - напишите что-то вроде "хорошо", "здорово", "супер", "круто", "нравится"
-• Если что-то не понравилось - напишите "не очень", "не нравится" или укажите конкретные проблемы
-
-Ваша обратная связь поможет нам улучшить сервис!"""
+    return Q_USER_FEEDBACK
 
 @register_tool(tags=["feedback_analysis", "goal_7_negative"])
 def analyze_negative_feedback() -> str:
@@ -376,16 +695,7 @@ def analyze_negative_feedback() -> str:
     Returns:
         A message asking for specific feedback about what didn't work
     """
-    return """Понимаю, что рекомендации не полностью соответствуют вашим ожиданиям.
-
-Помогите нам улучшить сервис! Расскажите подробнее:
-
-• Что именно вам не понравилось в рекомендациях?
-• Какая информация была неточной или неактуальной?
-• Что бы вы хотели изменить или добавить?
-• Есть ли конкретные требования, которые мы не учли?
-
-Ваши комментарии помогут нам сделать сервис лучше для будущих пользователей."""
+    return Q_NEGATIVE_FEEDBACK
 
 @register_tool(tags=["connection", "goal_8"])
 def offer_human_agent_connection() -> str:
@@ -394,19 +704,7 @@ def offer_human_agent_connection() -> str:
     Returns:
         A message offering to connect with a human travel agent
     """
-    return """Отлично! Рад, что рекомендации вам понравились! 🎉
-
-Если у вас есть дополнительные вопросы или вы хотите получить более персонализированную помощь, я могу связать вас с нашим живым турагентом.
-
-Наш специалист поможет вам:
-• Уточнить детали поездки
-• Забронировать отели и билеты
-• Ответить на любые вопросы о путешествии
-• Предоставить персональные рекомендации
-
-Хотите ли вы связаться с нашим турагентом? Напишите "да" или "нет".
-
-Спасибо за использование нашего сервиса! ✈️"""
+    return Q_HUMAN_AGENT_CONNECTION
 
 @register_tool(tags=["error_handling", "goal_9"])
 def handle_user_error() -> str:
@@ -415,10 +713,10 @@ def handle_user_error() -> str:
     Returns:
         A polite message asking for clarification
     """
-    current_goal = agent_state["current_goal"]
-    error_count = agent_state["error_count"]
+    current_goal = agent_state.current_goal
+    error_count = agent_state.error_count
     
-    if error_count >= agent_state["max_errors"]:
+    if error_count >= agent_state.max_errors:
         return "I apologize, but I'm having trouble understanding your responses. Please try again later or contact our support team for assistance. Thank you for your time!"
     
     goal_messages = {
@@ -451,15 +749,84 @@ def terminate(message: str = "Thank you for using our travel planning service!")
     """
     return f"{message}\nTerminating..."
 
+def _session_completed() -> str:
+    return "Travel planning session completed. Thank you!"
+
+# Goal handlers keyed by goal number; goals 1-5 store the answer under _RESPONSE_SLOTS[goal].
+# Fixed questions are stored as the text itself so the hot path skips the tool call;
+# the ask_* tools return the same constants for the Game agent.
+_GOAL_HANDLERS = {
+    1: Q_TRIP_TYPE,
+    2: Q_DESTINATION,
+    3: Q_GROUP_SIZE,
+    4: Q_TRAVEL_DATES,
+    5: Q_DEPARTURE_CITY,
+    6: generate_travel_summary,
+    7: Q_USER_FEEDBACK,
+    8: Q_HUMAN_AGENT_CONNECTION,
+}
+_RESPONSE_KEYS = (_K_TRIP_TYPE, _K_DESTINATION, _K_GROUP_SIZE, _K_TRAVEL_DATES, _K_DEPARTURE_CITY)
+_RESPONSE_SLOTS = dict(enumerate(_RESPONSE_KEYS, start=1))
+
+def _set_slot(goal: int, value: str) -> bool:
+    """Store the answer to an interview question in its slot.
+    
+    Args:
+        goal: Goal number of the question being answered
+        value: The user's answer
+        
+    Returns:
+        True if the goal is an interview question (1-5) and the slot was written
+    """
+    key = _RESPONSE_SLOTS.get(goal)
+    if key is None:
+        return False
+    agent_state.user_responses[key] = value
+    return True
+
+def _advance_goal(value: Optional[str] = None):
+    """Store the answer to the current goal, if given, and move to the next goal.
+    
+    Args:
+        value: The user's answer, or None when there is nothing to store
+    """
+    if value is not None:
+        _set_slot(agent_state.current_goal, value)
+    agent_state.current_goal += 1
+    agent_state.error_count = 0
+
+def run_goal_handler(goal: int) -> str:
+    """Run the handler for a goal and return its question or response.
+    
+    Args:
+        goal: Goal number (1-8)
+        
+    Returns:
+        The handler's response, or a completion message past the last goal
+    """
+    handler = _GOAL_HANDLERS.get(goal, _session_completed)
+    return handler() if callable(handler) else handler
+
+async def arun_goal_handler(goal: int, on_delta: Optional[Callable[[str], None]] = None) -> str:
+    """Async variant of run_goal_handler: the summary awaits Perplexity instead of blocking.
+    on_delta, if given, receives the summary in chunks as it streams."""
+    if goal == 6:
+        return await abuild_travel_summary(agent_state.user_responses, on_delta)
+    return run_goal_handler(goal)
+
 # Custom environment to handle state management
 class TravelAgentEnvironment(Environment):
     def __init__(self):
         super().__init__()
         self.state = agent_state
+        # The current turn's user message, not yet stored as an answer
+        self.pending_answer: Optional[str] = None
     
     def execute_action(self, action, args: dict) -> dict:
         """Execute an action and return the result with state management."""
         try:
+            if "sequential" in action.name or "main" in action.name:
+                self._store_pending_answer()
             result = action.execute(**args)
             
             # Update state based on action type
@@ -468,8 +835,8 @@ class TravelAgentEnvironment(Environment):
             elif "error" in action.name:
                 self._handle_error_response(result)
             elif "terminate" in action.name:
-                agent_state["conversation_active"] = False
-                agent_state["goal_completed"] = True
+                agent_state.conversation_active = False
+                agent_state.goal_completed = True
             
             return self.format_result(result)
         except Exception as e:
@@ -479,179 +846,337 @@ class TravelAgentEnvironment(Environment):
                 "traceback": str(e)
             }
     
+    def _store_pending_answer(self):
+        """Store the turn's user message as the answer to the question asked in the previous turn.
+        
+        Runs before the action so the summary (goal 6) already sees the last answer; the message
+        is consumed so later steps of the same turn do not store it again.
+        """
+        if self.pending_answer is not None:
+            _set_slot(agent_state.current_goal - 1, self.pending_answer)
+            self.pending_answer = None
+    
     def _handle_sequential_response(self, result):
         """Handle response for sequential travel planning."""
-        current_goal = agent_state["current_goal"]
-        
-        # Store the user's response based on current goal
-        if current_goal == 1:
-            agent_state["user_responses"]["trip_type"] = "User specified trip type"
-        elif current_goal == 2:
-            agent_state["user_responses"]["destination"] = "User specified destination"
-        elif current_goal == 3:
-            agent_state["user_responses"]["group_size"] = "User specified group size"
-        elif current_goal == 4:
-            agent_state["user_responses"]["travel_dates"] = "User specified dates"
-        elif current_goal == 5:
-            agent_state["user_responses"]["departure_city"] = "User specified departure city"
-        elif current_goal == 6:
+        # The answer was stored before the action ran; the environment only advances the goal
+        if agent_state.current_goal == 6:
             # Summary generated, conversation complete
-            agent_state["conversation_active"] = False
-            agent_state["goal_completed"] = True
+            agent_state.conversation_active = False
+            agent_state.goal_completed = True
             return
         
-        # Move to next goal
-        agent_state["current_goal"] += 1
-        agent_state["error_count"] = 0
+        _advance_goal()
     
     def _handle_error_response(self, result):
         """Handle error response."""
-        agent_state["error_count"] += 1
+        agent_state.error_count += 1
         # Stay on current goal to retry
 
+# Goals 1-5 always map to the same tool call, so the agent does not need the LLM to pick it
+_SEQUENTIAL_INVOCATION = json.dumps({"tool": "execute_sequential_travel_planning", "args": {}})
+
+# LLM decisions for the first step of a turn keyed by (current_goal, filled slots, normalized
+# user input), least recently used evicted first. The slots are part of the prompt, so one user's answer is never replayed
+# to another; within a session repeated answers ("Париж", "2 человека") skip the LLM.
+RESPONSE_CACHE_MAXSIZE = 256
+RESPONSE_CACHE: "OrderedDict[Tuple[int, str, str], str]" = OrderedDict()
+
+def _last_user_message(prompt: Prompt) -> Optional[str]:
+    for message in reversed(prompt.messages):
+        if message.get("role") == "user":
+            return message.get("content")
+    return None
+
+def _is_first_step(prompt: Prompt) -> bool:
+    """True until the agent has acted in the current turn (the prompt only holds the current turn)"""
+    return not any(message.get("role") == "assistant" for message in prompt.messages)
+
+def generate_travel_response(prompt: Prompt) -> str:
+    """Decide the agent's next action, only calling the LLM when the choice is not fixed.
+    
+    On the first step of a turn during the fixed questions (goals 1-5) the next action is
+    always execute_sequential_travel_planning, so that invocation is returned directly.
+    Later steps of the same turn go to the LLM, which decides whether to stop.
+    
+    Args:
+        prompt: The prompt the agent would send to the LLM
+        
+    Returns:
+        A JSON tool invocation or the LLM response
+    """
+    first_step = _is_first_step(prompt)
+    if agent_state.current_goal <= len(_RESPONSE_KEYS) and first_step:
+        return _SEQUENTIAL_INVOCATION
+    
+    _ensure_llm_initialized()
+    # Later steps depend on the tool results of this turn, which the cache key does not cover
+    user_input = _last_user_message(prompt) if first_step else None
+    if user_input is None:
+        return generate_response(prompt)
+    
+    key = (agent_state.current_goal, SlotMemory(agent_state.user_responses).as_prompt(), normalize_message(user_input))
+    cached = RESPONSE_CACHE.get(key)
+    if cached is not None:
+        RESPONSE_CACHE.move_to_end(key)
+        return cached
+    
+    result = generate_response(prompt)
+    if isinstance(result, str) and not result.startswith("Error:"):
+        RESPONSE_CACHE[key] = result
+        if len(RESPONSE_CACHE) > RESPONSE_CACHE_MAXSIZE:
+            RESPONSE_CACHE.popitem(last=False)
+    return result
+
+@functools.lru_cache(maxsize=8)
+def _goal_messages(agent_goals: Tuple[Goal, ...]) -> Tuple[Dict, ...]:
+    """Format the goals into system messages once per goal set"""
+    return tuple(AgentFunctionCallingActionLanguage().format_goals(list(agent_goals)))
+
+class SlotMemory:
+    """Structured conversation memory: the interview answers keyed by slot name"""
+    
+    def __init__(self, slots: Dict[str, str]):
+        self.slots = slots
+    
+    def as_prompt(self) -> str:
+        """Serialize only the filled slots"""
+        return json.dumps({k: v for k, v in self.slots.items() if v}, ensure_ascii=False)
+
+class TravelAgentLanguage(AgentFunctionCallingActionLanguage):
+    """Function-calling language that keeps the system prompt byte-identical across turns.
+    
+    Provider-side prompt caching only reuses an exact prefix, so the goal instructions are
+    formatted once and the changing conversation state is sent as a trailing system
+    message instead of being mixed into the prefix. Earlier turns are represented by the
+    slot memory rather than replayed, so the prompt does not grow with the conversation.
+    """
+    
+    def format_state(self) -> Dict:
+        """Format the current goal and filled slots as a system message"""
+        slots = SlotMemory(agent_state.user_responses).as_prompt()
+        return {"role": "system", "content": f'state={{"current_goal": {agent_state.current_goal}, "slots": {slots}}}'}
+    
+    def format_memory(self, memory: Memory) -> List:
+        """Format only the current turn, starting at the latest user message"""
+        items = memory.get_memories()
+        start = max((i for i, item in enumerate(items) if item["type"] == "user"), default=0)
+        turn = Memory()
+        turn.items = items[start:]
+        return super().format_memory(turn)
+    
+    def construct_prompt(self,
+                         actions: List,
+                         environment: Environment,
+                         goals: List[Goal],
+                         memory) -> Prompt:
+        prompt = list(_goal_messages(tuple(goals)))
+        prompt += self.format_memory(memory)
+        prompt.append(self.format_state())
+        
+        return Prompt(messages=prompt, tools=self.format_actions(actions))
+
+# The language keeps no per-agent state, so one instance serves every agent
+_AGENT_LANGUAGE = TravelAgentLanguage()
+
+# Prebuilt tool metadata, regenerate with: python travel_agent.py --build-tool-manifest
+TOOL_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tools", "travel_tools.json")
+
+def build_tool_manifest(path: str = TOOL_MANIFEST_PATH):
+    """Write the metadata of the registered travel tools to the tool manifest"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_tool_manifest(path)
+
+# Tags of the tools the travel agent may call
+_AGENT_TOOL_TAGS = ("sequential", "main", "error_handling", "system")
+
+@functools.lru_cache(maxsize=8)
+def _action_registry(tags: Tuple[str, ...]) -> PythonActionRegistry:
+    """Build the action registry for a tag set once; agents only read from it"""
+    if not TOOLS_FROM_MANIFEST:
+        # The decorators registered the live metadata; a manifest on disk may be stale
+        return PythonActionRegistry(tags=list(tags))
+    if not os.path.exists(TOOL_MANIFEST_PATH):
+        # The decorators registered nothing, a registry built from them would be empty
+        raise FileNotFoundError(f"GAME_TOOLS_FROM_MANIFEST=1 but {TOOL_MANIFEST_PATH} does not exist, "
+                                "build it with: python travel_agent.py --build-tool-manifest")
+    return PythonActionRegistry.from_manifest(TOOL_MANIFEST_PATH, sys.modules[__name__], tags=list(tags))
+
+class TravelAgent(Agent):
+    """Agent that hands each turn's user message to the environment as the latest answer"""
+    
+    def set_current_task(self, memory: Memory, task: str):
+        super().set_current_task(memory, task)
+        self.environment.pending_answer = task
+
 def create_travel_agent():
     """Create and configure the advanced travel agent"""
     
+    _ensure_llm_initialized()
+    
     # Reset global state
-    global agent_state
-    agent_state = {
-        "current_goal": 1,
-        "user_responses": {},
-        "error_count": 0,
-        "max_errors": 3
-    }
+    reset_agent_state()
     
-    # Define the agent language and environment
-    agent_language = AgentFunctionCallingActionLanguage()
+    # Define the environment; the agent language is stateless and shared
     environment = TravelAgentEnvironment()
     
     # Create the agent with the specified goals and tools
-    travel_agent = Agent(
+    travel_agent = TravelAgent(
         goals=goals,
-        agent_language=AgentFunctionCallingActionLanguage(),
+        agent_language=_AGENT_LANGUAGE,
         # The ActionRegistry automatically loads tools with these tags
-        action_registry=PythonActionRegistry(tags=["sequential", "main", "error_handling", "system"]),
-        generate_response=generate_response,
+        action_registry=_action_registry(_AGENT_TOOL_TAGS),
+        generate_response=generate_travel_response,
         environment=environment
     )
     
     return travel_agent
 
-def run_travel_agent_with_input(user_input: str):
-    """Run the travel agent with provided input and return the memory"""
+def _record_turn(user_input: str, current_goal: int, response: str) -> Memory:
+    """Build the memory for a turn and note that the first question has been asked"""
     
     # Create a simple memory to track the conversation
-    from game.core import Memory
     memory = Memory()
     
     # Add the initial user input
     memory.add_memory({"type": "user", "content": user_input})
     
-    # Execute the sequential travel planning based on current goal
-    current_goal = agent_state["current_goal"]
-    
     if current_goal == 1:
-        response = ask_trip_type()
         # Mark that we've asked the first goal question so the next input is treated as an answer
-        agent_state["has_asked_goal_1"] = True
-    elif current_goal == 2:
-        response = ask_destination()
-    elif current_goal == 3:
-        response = ask_group_size()
-    elif current_goal == 4:
-        response = ask_travel_dates()
-    elif current_goal == 5:
-        response = ask_departure_city()
-    elif current_goal == 6:
-        response = generate_travel_summary()
-    elif current_goal == 7:
-        response = ask_user_feedback()
-    elif current_goal == 8:
-        response = offer_human_agent_connection()
-    else:
-        response = "Travel planning session completed. Thank you!"
+        agent_state.has_asked_goal_1 = True
     
     memory.add_memory({"type": "assistant", "content": response})
     
     return memory
 
+def run_travel_agent_with_input(user_input: str):
+    """Run the travel agent with provided input and return the memory"""
+    
+    # Execute the sequential travel planning based on current goal
+    current_goal = agent_state.current_goal
+    return _record_turn(user_input, current_goal, run_goal_handler(current_goal))
+
+async def arun_travel_agent_with_input(user_input: str, on_delta: Optional[Callable[[str], None]] = None,
+                                      on_user_item: Optional[Callable[[Dict[str, str]], None]] = None):
+    """Async variant of run_travel_agent_with_input; on_delta receives streamed assistant text.
+    
+    on_user_item receives the turn's user memory item before the handler runs, so a stream
+    can show it ahead of the assistant text; the returned memory still starts with it.
+    """
+    current_goal = agent_state.current_goal
+    if on_user_item:
+        on_user_item({"type": "user", "content": user_input})
+    return _record_turn(user_input, current_goal, await arun_goal_handler(current_goal, on_delta))
+
 def process_user_response(user_response: str):
     """Process user response and advance to next goal"""
+    memory = _apply_user_response(user_response)
+    if memory is not None:
+        return memory
+    
+    # Return the next question or summary
+    return run_travel_agent_with_input("continue")
+
+async def aprocess_user_response(user_response: str, on_delta: Optional[Callable[[str], None]] = None,
+                                 on_user_item: Optional[Callable[[Dict[str, str]], None]] = None):
+    """Async variant of process_user_response; on_delta and on_user_item as in arun_travel_agent_with_input"""
+    if agent_state.current_goal == PERPLEXITY_WARMUP_GOAL:
+        schedule_perplexity_warmup()
+    
+    memory = _apply_user_response(user_response)
+    if memory is not None:
+        return memory
     
-    # Store the user's response based on current goal
-    current_goal = agent_state["current_goal"]
+    return await arun_travel_agent_with_input("continue", on_delta, on_user_item)
+
+def _apply_user_response(user_response: str) -> Optional[Memory]:
+    """Store a user response and update the goal.
     
-    if current_goal == 1:
-        agent_state["user_responses"]["trip_type"] = user_response
-    elif current_goal == 2:
-        agent_state["user_responses"]["destination"] = user_response
-    elif current_goal == 3:
-        agent_state["user_responses"]["group_size"] = user_response
-    elif current_goal == 4:
-        agent_state["user_responses"]["travel_dates"] = user_response
-    elif current_goal == 5:
-        agent_state["user_responses"]["departure_city"] = user_response
-    elif current_goal == 7:
-        # Handle feedback analysis
-        agent_state["user_responses"]["feedback"] = user_response
-        sentiment = analyze_feedback_sentiment(user_response)
-        
-        if sentiment == "negative":
-            # Stay on goal 7 but show negative feedback analysis
-            agent_state["current_goal"] = 7  # Stay on current goal
-            agent_state["error_count"] = 0
-            agent_state["has_asked_goal_1"] = True
+    Returns:
+        The finished turn's memory when the response is answered directly (feedback,
+        human agent connection), or None when the next goal's handler should run
+    """
+    current_goal = agent_state.current_goal
+    
+    match current_goal:
+        case 7:
+            # Handle feedback analysis
+            agent_state.user_responses[_K_FEEDBACK] = user_response
             
-            # Create memory with negative feedback response
-            from game.core import Memory
-            memory = Memory()
-            memory.add_memory({"type": "user", "content": user_response})
-            memory.add_memory({"type": "assistant", "content": analyze_negative_feedback()})
-            return memory
-        elif sentiment == "positive":
-            # Move to goal 8 (human agent connection)
-            agent_state["current_goal"] = 8
-        else:
-            # Neutral feedback - ask for clarification
-            agent_state["current_goal"] = 7  # Stay on current goal
-            agent_state["error_count"] = 0
-            agent_state["has_asked_goal_1"] = True
+            match analyze_feedback_sentiment(user_response):
+                case "negative":
+                    # Stay on goal 7 but show negative feedback analysis
+                    agent_state.current_goal = 7  # Stay on current goal
+                    agent_state.error_count = 0
+                    agent_state.has_asked_goal_1 = True
+                    
+                    # Create memory with negative feedback response
+                    memory = Memory()
+                    memory.add_memory({"type": "user", "content": user_response})
+                    memory.add_memory({"type": "assistant", "content": Q_NEGATIVE_FEEDBACK})
+                    return memory
+                case "positive":
+                    # Move to goal 8 (human agent connection)
+                    agent_state.current_goal = 8
+                case _:
+                    # Neutral feedback - ask for clarification
+                    agent_state.current_goal = 7  # Stay on current goal
+                    agent_state.error_count = 0
+                    agent_state.has_asked_goal_1 = True
+                    
+                    # Create memory with clarification request
+                    memory = Memory()
+                    memory.add_memory({"type": "user", "content": user_response})
+                    memory.add_memory({"type": "assistant", "content": Q_FEEDBACK_CLARIFICATION})
+                    return memory
+        case 8:
+            # Handle human agent connection response
+            agent_state.user_responses[_K_HUMAN_AGENT_REQUEST] = user_response
+            # End the conversation
+            agent_state.conversation_active = False
+            agent_state.goal_completed = True
             
-            # Create memory with clarification request
-            from game.core import Memory
+            # Create final memory
             memory = Memory()
             memory.add_memory({"type": "user", "content": user_response})
-            memory.add_memory({"type": "assistant", "content": "Пожалуйста, уточните ваше мнение. Вам понравились рекомендации или есть что-то, что нужно улучшить?"})
+            
+            if "да" in user_response.lower() or "yes" in user_response.lower():
+                final_response = "Отлично! Наш турагент свяжется с вами в ближайшее время. Спасибо за использование нашего сервиса! ✈️"
+            else:
+                final_response = "Спасибо за использование нашего сервиса! Если у вас возникнут вопросы, мы всегда готовы помочь. Удачного путешествия! 🎉"
+            
+            memory.add_memory({"type": "assistant", "content": final_response})
             return memory
-    elif current_goal == 8:
-        # Handle human agent connection response
-        agent_state["user_responses"]["human_agent_request"] = user_response
-        # End the conversation
-        agent_state["conversation_active"] = False
-        agent_state["goal_completed"] = True
-        
-        # Create final memory
-        from game.core import Memory
-        memory = Memory()
-        memory.add_memory({"type": "user", "content": user_response})
-        
-        if "да" in user_response.lower() or "yes" in user_response.lower():
-            final_response = "Отлично! Наш турагент свяжется с вами в ближайшее время. Спасибо за использование нашего сервиса! ✈️"
-        else:
-            final_response = "Спасибо за использование нашего сервиса! Если у вас возникнут вопросы, мы всегда готовы помочь. Удачного путешествия! 🎉"
+        case _ if current_goal <= 6:
+            # For goals 1-6, move to next goal normally
+            _advance_goal(user_response)
+            # Once we start processing answers, we no longer need the flag
+            agent_state.has_asked_goal_1 = True
+    
+    return None
+
+def run_travel_agent_batch(inputs: List[str], max_workers: int = 4) -> List[str]:
+    """Generate travel summaries for many interviews offline.
+    
+    Each input holds the five interview answers in question order, separated by "|".
+    The questions are fixed, so the answers are filled in locally and only the
+    Perplexity lookups go over the network, concurrently and once per distinct input.
+    
+    Args:
+        inputs: Interview answers, one interview per item
+        max_workers: Number of concurrent Perplexity requests
         
-        memory.add_memory({"type": "assistant", "content": final_response})
-        return memory
+    Returns:
+        The travel summary for each input, in input order
+    """
+    def summarize(line: str) -> str:
+        answers = [answer.strip() for answer in line.split("|")]
+        return build_travel_summary(dict(zip(_RESPONSE_KEYS, answers)))
     
-    # For goals 1-6, move to next goal normally
-    if current_goal <= 6:
-        agent_state["current_goal"] += 1
-        agent_state["error_count"] = 0
-        # Once we start processing answers, we no longer need the flag
-        agent_state["has_asked_goal_1"] = True
+    unique_inputs = list(dict.fromkeys(inputs))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        summaries = dict(zip(unique_inputs, executor.map(summarize, unique_inputs)))
     
-    # Return the next question or summary
-    return run_travel_agent_with_input("continue")
+    return [summaries[line] for line in inputs]
 
 def run_travel_agent():
     """Run the travel agent and display the final memory (standalone version)"""
@@ -684,4 +1209,7 @@ def run_travel_agent():
     print("✅ Agent session completed!")
 
 if __name__ == "__main__":
-    run_travel_agent()
\ No newline at end of file
+    if "--build-tool-manifest" in sys.argv:
+        build_tool_manifest()
+    else:
+        run_travel_agent()
\ No newline at end of file